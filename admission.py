@@ -0,0 +1,264 @@
+import asyncio
+import contextvars
+import logging
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Dict, Optional
+from config import (
+    GEMINI_MAX_CONCURRENT, GEMINI_QUEUE_MAX, GEMINI_QUEUE_TIMEOUT,
+    USER_REQUESTS_PER_MINUTE, USER_REQUESTS_BURST
+)
+
+logger = logging.getLogger(__name__)
+
+class UserRequest:
+    """Одно действие пользователя (нажатие кнопки, сообщение): лимит списывается один раз на действие"""
+
+    def __init__(self, user_id: Optional[int], on_queue_position: Callable[[int], Awaitable[None]] = None):
+        self.user_id = user_id
+        self.on_queue_position = on_queue_position
+        self.charged_bucket = None  # ведро, из которого списан токен за это действие
+
+# Текущее действие. Задается обработчиком бота перед генерацией; задачи,
+# созданные внутри (например, параллельные варианты), видят тот же объект
+current_request = contextvars.ContextVar('current_request', default=None)
+
+def bind_request(user_id: Optional[int], on_queue_position: Callable[[int], Awaitable[None]] = None):
+    """Привязка текущей задачи к действию пользователя для учета лимитов"""
+    current_request.set(UserRequest(user_id, on_queue_position))
+
+class AdmissionRejected(Exception):
+    """Запрос не допущен к модели; текст исключения можно показать пользователю"""
+
+    def __init__(self, message: str, reason: str):
+        super().__init__(message)
+        self.reason = reason
+
+class TokenBucket:
+    """Ведро токенов: rate токенов в секунду, не больше capacity"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, cost: float = 1.0) -> bool:
+        """Списание токенов, если их хватает"""
+        self._refill()
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return True
+        return False
+
+    def refund(self, cost: float = 1.0):
+        """Возврат списанных токенов"""
+        self.tokens = min(self.capacity, self.tokens + cost)
+
+    def retry_after(self, cost: float = 1.0) -> float:
+        """Через сколько секунд хватит токенов"""
+        self._refill()
+        return max(0.0, (cost - self.tokens) / self.rate)
+
+class AdmissionController:
+    """Допуск запросов к модели.
+
+    Каждый пользователь ограничен своим ведром токенов, одновременно к API
+    идет не больше max_concurrent запросов. Остальные ждут в честной
+    очереди: пользователи обслуживаются по кругу, поэтому серия нажатий
+    одного не задерживает других. Если очередь переполнена или ожидание
+    слишком долгое, запрос сразу отклоняется понятным сообщением.
+    """
+
+    def __init__(self, max_concurrent: int = GEMINI_MAX_CONCURRENT, max_queue: int = GEMINI_QUEUE_MAX,
+                 queue_timeout: float = GEMINI_QUEUE_TIMEOUT,
+                 user_rate_per_minute: float = USER_REQUESTS_PER_MINUTE,
+                 user_burst: float = USER_REQUESTS_BURST):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.user_rate = user_rate_per_minute / 60.0
+        self.user_burst = user_burst
+
+        self._active = 0
+        self._buckets: Dict[int, TokenBucket] = {}
+        self._queues: "OrderedDict[Optional[int], deque]" = OrderedDict()
+        self._waiting = 0
+
+        self.admitted = 0
+        self.rejected = 0
+
+    @asynccontextmanager
+    async def slot(self, user_id: Optional[int] = None):
+        """Слот для одного вызова модели.
+
+        Без user_id вызов относится к текущему действию (bind_request), и лимит
+        пользователя списывается один раз на действие, а не на каждый вызов.
+        """
+        request = current_request.get() if user_id is None else UserRequest(user_id)
+        charged = self.charge(request)
+        try:
+            await self._acquire(request)
+        except AdmissionRejected:
+            # Запрос отклонен из-за общей нагрузки - лимит пользователя не тратим
+            if charged:
+                self._refund(request)
+            raise
+        try:
+            yield
+        finally:
+            self._release()
+
+    def charge(self, request: UserRequest = None) -> bool:
+        """Списание лимита за действие пользователя; True, если списано сейчас.
+        AdmissionRejected, если лимит исчерпан"""
+        if request is None:
+            request = current_request.get()
+        if request is None or request.user_id is None or request.charged_bucket is not None:
+            return False
+
+        bucket = self._bucket(request.user_id)
+        if not bucket.try_acquire():
+            self.rejected += 1
+            wait = max(1, round(bucket.retry_after()))
+            raise AdmissionRejected(
+                f"⏳ Слишком много запросов подряд. Попробуйте снова через {wait} сек.",
+                'rate_limited'
+            )
+        request.charged_bucket = bucket
+        return True
+
+    def try_acquire_nowait(self) -> bool:
+        """Слот, только если он свободен прямо сейчас и очереди нет (для дублирующих запросов)"""
+        if self._active < self.max_concurrent and not self._waiting:
+            self._active += 1
+            return True
+        return False
+
+    def release(self):
+        """Освобождение слота, полученного через try_acquire_nowait"""
+        self._release()
+
+    def stats(self) -> Dict:
+        """Текущая загрузка"""
+        return {
+            'active': self._active,
+            'queued': self._waiting,
+            'admitted': self.admitted,
+            'rejected': self.rejected
+        }
+
+    def _refund(self, request: UserRequest):
+        """Возврат лимита за действие, которое не дошло до модели"""
+        bucket, request.charged_bucket = request.charged_bucket, None
+        if bucket is not None:
+            bucket.refund()
+
+    def _bucket(self, user_id: int) -> TokenBucket:
+        """Ведро токенов пользователя"""
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            bucket = self._buckets[user_id] = TokenBucket(self.user_rate, self.user_burst)
+            if len(self._buckets) > 10000:
+                # Полные ведра ничего не помнят - их можно выбросить
+                for uid in [uid for uid, b in self._buckets.items() if b.tokens >= b.capacity and uid != user_id]:
+                    del self._buckets[uid]
+        return bucket
+
+    async def _acquire(self, request: Optional[UserRequest]):
+        """Ожидание свободного слота в честной очереди"""
+        user_id = request.user_id if request else None
+        if self._active < self.max_concurrent and not self._waiting:
+            self._active += 1
+            self.admitted += 1
+            return
+
+        if self._waiting >= self.max_queue:
+            self.rejected += 1
+            logger.warning(f"Shedding model request: {self._waiting} requests already queued")
+            raise AdmissionRejected(
+                "🚦 Сейчас очень много запросов к ИИ. Попробуйте, пожалуйста, через минуту.",
+                'overloaded'
+            )
+
+        waiter = asyncio.get_running_loop().create_future()
+        listener = request.on_queue_position if request else None
+        entry = [waiter, listener, None]  # последнее сообщенное место
+        self._queues.setdefault(user_id, deque()).append(entry)
+        self._waiting += 1
+        self._notify_positions()
+
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout=self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # Слот уже выдан - возвращаем его
+                self._release()
+            else:
+                waiter.cancel()
+                self._remove(user_id, entry)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self.rejected += 1
+            raise AdmissionRejected(
+                "🚦 Очередь к ИИ не успела дойти до вашего запроса. Попробуйте еще раз чуть позже.",
+                'overloaded'
+            )
+        self.admitted += 1
+
+    def _release(self):
+        """Освобождение слота: он передается следующему в очереди"""
+        while self._queues:
+            # Круговой обход пользователей: берем первого, его очередь - в конец
+            user_id, queue = next(iter(self._queues.items()))
+            waiter = queue.popleft()[0]
+            self._waiting -= 1
+            if queue:
+                self._queues.move_to_end(user_id)
+            else:
+                del self._queues[user_id]
+
+            if not waiter.done():
+                waiter.set_result(True)  # слот переходит без изменения _active
+                self._notify_positions()
+                return
+
+        self._active -= 1
+
+    def _remove(self, user_id: Optional[int], entry):
+        """Удаление ожидающего из очереди"""
+        queue = self._queues.get(user_id)
+        if queue and entry in queue:
+            queue.remove(entry)
+            self._waiting -= 1
+            if not queue:
+                del self._queues[user_id]
+            self._notify_positions()
+
+    def _notify_positions(self):
+        """Сообщение ожидающим их места в очереди (в порядке кругового обхода)"""
+        order = []
+        queues = [list(queue) for queue in self._queues.values()]
+        for index in range(max((len(q) for q in queues), default=0)):
+            for queue in queues:
+                if index < len(queue):
+                    order.append(queue[index])
+
+        for position, entry in enumerate(order, 1):
+            waiter, listener, notified = entry
+            if listener and not waiter.done() and position != notified:
+                entry[2] = position
+                asyncio.ensure_future(self._safe_notify(listener, position))
+
+    @staticmethod
+    async def _safe_notify(listener: Callable[[int], Awaitable[None]], position: int):
+        try:
+            await listener(position)
+        except Exception as e:
+            logger.debug(f"Queue position notification failed: {e}")
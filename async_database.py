@@ -0,0 +1,200 @@
+import asyncio
+import functools
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List, Dict, Optional
+from database import Database
+from config import (
+    DATABASE_READER_THREADS, DATABASE_WRITE_BATCH_SIZE, DATABASE_WRITE_BATCH_WINDOW,
+    POSTS_BULK_CHUNK_SIZE
+)
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+def _resolve_future(future: asyncio.Future, result, error: Optional[BaseException]):
+    """Передача результата записи обратно в event loop"""
+    if future.cancelled():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+class AsyncDatabase:
+    """Асинхронный фасад над Database.
+
+    Чтение выполняется в небольшом пуле потоков (WAL позволяет читать
+    параллельно), запись - в отдельном потоке-писателе, который объединяет
+    накопившиеся запросы от разных обработчиков в одну транзакцию.
+    """
+
+    def __init__(self, db: Database = None, readers: int = DATABASE_READER_THREADS):
+        self.db = db or Database()
+        self._readers = ThreadPoolExecutor(max_workers=readers, thread_name_prefix='db-reader')
+        self._write_queue = queue.Queue()
+        self._writer = threading.Thread(target=self._writer_loop, name='db-writer', daemon=True)
+        self._writer.start()
+        self._closed = False
+
+    async def _read(self, method: str, *args, **kwargs):
+        """Выполнение запроса на чтение в пуле читателей"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._readers,
+            functools.partial(getattr(self.db, method), *args, **kwargs)
+        )
+
+    async def _write(self, method: str, *args, **kwargs):
+        """Постановка записи в очередь потока-писателя"""
+        if self._closed:
+            raise RuntimeError("AsyncDatabase is closed")
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        call = functools.partial(getattr(self.db, method), *args, **kwargs)
+        self._write_queue.put((call, loop, future))
+        return await future
+
+    def _writer_loop(self):
+        """Основной цикл потока-писателя"""
+        while True:
+            item = self._write_queue.get()
+            if item is _STOP:
+                break
+
+            # Добираем запросы, пришедшие за короткое окно, в ту же транзакцию
+            batch = [item]
+            stop = False
+            deadline = time.monotonic() + DATABASE_WRITE_BATCH_WINDOW
+            while len(batch) < DATABASE_WRITE_BATCH_SIZE:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._write_queue.get(timeout=remaining) if remaining > 0 else self._write_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+
+            self._run_batch(batch)
+            if stop:
+                break
+
+    def _run_batch(self, batch: List):
+        """Выполнение пачки записей в одной транзакции"""
+        results = []
+        try:
+            with self.db.transaction():
+                for call, loop, future in batch:
+                    # Каждая запись - в своем SAVEPOINT, ошибка одной не откатывает остальные
+                    try:
+                        with self.db.transaction():
+                            results.append((loop, future, call(), None))
+                    except Exception as e:
+                        results.append((loop, future, None, e))
+        except Exception as e:
+            logger.error(f"Error committing write batch of {len(batch)}: {e}")
+            results = [(loop, future, None, e) for _, loop, future in batch]
+
+        for loop, future, result, error in results:
+            try:
+                loop.call_soon_threadsafe(_resolve_future, future, result, error)
+            except RuntimeError:
+                # Event loop уже закрыт - результат некому отдавать
+                pass
+
+    async def close(self):
+        """Остановка потоков и закрытие соединений"""
+        if self._closed:
+            return
+        self._closed = True
+
+        self._write_queue.put(_STOP)
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._writer.join)
+        self._readers.shutdown(wait=True)
+        self.db.close()
+
+    # Чтение
+
+    async def get_user_channels(self, user_id: int) -> List[Dict]:
+        """Получение каналов пользователя"""
+        return await self._read('get_user_channels', user_id)
+
+    async def get_user_channels_with_styles(self, user_id: int, include_analysis: bool = False) -> List[Dict]:
+        """Получение каналов пользователя вместе со статусом анализа"""
+        return await self._read('get_user_channels_with_styles', user_id, include_analysis)
+
+    async def get_channel_posts(self, channel_id: int, limit: int = 50) -> List[Dict]:
+        """Получение постов канала"""
+        return await self._read('get_channel_posts', channel_id, limit)
+
+    async def get_unanalyzed_posts(self, channel_id: int, limit: int = 50) -> List[Dict]:
+        """Посты канала, еще не учтенные в анализе стиля"""
+        return await self._read('get_unanalyzed_posts', channel_id, limit)
+
+    async def get_style_analysis(self, channel_id: int) -> Optional[Dict]:
+        """Получение анализа стиля канала"""
+        return await self._read('get_style_analysis', channel_id)
+
+    async def get_feed_cache_entries(self, limit: int = 100) -> List[Dict]:
+        """Получение последних записей кэша RSS лент"""
+        return await self._read('get_feed_cache_entries', limit)
+
+    async def get_generation_cache_entry(self, key: str, now: float) -> Optional[Dict]:
+        """Получение непросроченного ответа Gemini из кэша"""
+        return await self._read('get_generation_cache_entry', key, now)
+
+    async def search_articles(self, topic: str, limit: int = 10, max_age_hours: int = None) -> List[Dict]:
+        """Поиск статей по теме в локальном хранилище"""
+        return await self._read('search_articles', topic, limit, max_age_hours)
+
+    # Запись
+
+    async def add_user(self, user_id: int, username: str = None, first_name: str = None, last_name: str = None) -> bool:
+        """Добавление пользователя"""
+        return await self._write('add_user', user_id, username, first_name, last_name)
+
+    async def add_channel(self, channel_id: int, channel_name: str, user_id: int, channel_username: str = None) -> bool:
+        """Добавление канала"""
+        return await self._write('add_channel', channel_id, channel_name, user_id, channel_username)
+
+    async def add_posts(self, channel_id: int, posts: Iterable[Dict]) -> bool:
+        """Добавление постов канала"""
+        return await self._write('add_posts', channel_id, posts)
+
+    async def add_posts_bulk(self, channel_id: int, posts: Iterable[Dict], chunk_size: int = POSTS_BULK_CHUNK_SIZE) -> Optional[Dict]:
+        """Потоковая загрузка постов пачками в одной транзакции"""
+        return await self._write('add_posts_bulk', channel_id, posts, chunk_size)
+
+    async def save_style_analysis(self, channel_id: int, style_analysis: str, posts_count: Optional[int],
+                                  analyzed_post_ids: Iterable[int] = None) -> bool:
+        """Сохранение анализа стиля канала"""
+        return await self._write('save_style_analysis', channel_id, style_analysis, posts_count, analyzed_post_ids)
+
+    async def save_feed_cache_entry(self, url: str, etag: Optional[str], last_modified: Optional[str],
+                                    fetched_at: float, articles: str) -> bool:
+        """Сохранение записи кэша RSS ленты"""
+        return await self._write('save_feed_cache_entry', url, etag, last_modified, fetched_at, articles)
+
+    async def save_generation_cache_entry(self, key: str, operation: str, response: str, expires_at: float) -> bool:
+        """Сохранение ответа Gemini в кэш"""
+        return await self._write('save_generation_cache_entry', key, operation, response, expires_at)
+
+    async def prune_generation_cache(self, now: float) -> int:
+        """Удаление просроченных ответов Gemini"""
+        return await self._write('prune_generation_cache', now)
+
+    async def add_articles(self, feed_url: str, articles: Iterable[Dict]) -> int:
+        """Сохранение статей из ленты"""
+        return await self._write('add_articles', feed_url, articles)
+
+    async def prune_articles(self, older_than_days: int) -> int:
+        """Удаление устаревших статей"""
+        return await self._write('prune_articles', older_than_days)
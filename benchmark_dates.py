@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Микробенчмарк разбора дат RSS: старый перебор форматов против DateNormalizer.
+
+По умолчанию замер идет на синтетических данных: SAMPLES ниже - вручную
+записанные образцы дат в формате каждой ленты, размноженные по
+ENTRIES_PER_SOURCE записей. Реальные даты из лент RSS_SOURCES добавляются
+только с флагом --live (нужна сеть).
+"""
+
+import sys
+import timeit
+from datetime import datetime
+import feedparser
+from news_dates import DateNormalizer
+from config import RSS_SOURCES
+
+# Вручную записанные образцы: формат дат каждой ленты, значения синтетические
+SAMPLES = {
+    'https://feeds.bbci.co.uk/news/rss.xml': 'Fri, 17 Oct 2025 09:12:45 GMT',
+    'https://rss.cnn.com/rss/edition.rss': 'Thu, 16 Oct 2025 21:03:11 GMT',
+    'https://www.reuters.com/rssFeed/worldNews': 'Fri, 17 Oct 2025 06:58:02 +0000',
+    'https://techcrunch.com/feed/': 'Fri, 17 Oct 2025 14:30:00 +0000',
+    'https://habr.com/ru/rss/hub/artificial_intelligence/': 'Fri, 17 Oct 2025 10:05:12 GMT',
+    'https://lenta.ru/rss': 'Fri, 17 Oct 2025 12:41:00 +0300',
+    'https://news.google.com/rss/search': 'Fri, 17 Oct 2025 07:00:00 GMT',
+    'atom': '2025-10-17T08:15:30+03:00',
+}
+
+ENTRIES_PER_SOURCE = 50
+ROUNDS = 20
+
+def legacy_parse_date(date_str: str) -> datetime:
+    """Прежний NewsSearcher._parse_date"""
+    if not date_str:
+        return datetime.min
+    formats = [
+        '%a, %d %b %Y %H:%M:%S %z',
+        '%a, %d %b %Y %H:%M:%S %Z',
+        '%Y-%m-%dT%H:%M:%S%z',
+        '%Y-%m-%d %H:%M:%S',
+        '%d.%m.%Y %H:%M'
+    ]
+    for fmt in formats:
+        try:
+            return datetime.strptime(date_str, fmt)
+        except ValueError:
+            continue
+    return datetime.now()
+
+def load_live_samples() -> dict:
+    """Даты из текущих выпусков лент"""
+    samples = {}
+    for url in RSS_SOURCES:
+        feed = feedparser.parse(url)
+        entries = [entry for entry in feed.entries if entry.get('published')]
+        if entries:
+            samples[url] = entries
+            print(f"  {url}: {len(entries)} записей")
+        else:
+            print(f"  {url}: нет данных")
+    return samples
+
+def main():
+    samples = {
+        source: [{'published': value} for _ in range(ENTRIES_PER_SOURCE)]
+        for source, value in SAMPLES.items()
+    }
+    if '--live' in sys.argv:
+        print("Загрузка лент...")
+        samples.update(load_live_samples())
+
+    total = sum(len(entries) for entries in samples.values())
+    normalizer = DateNormalizer()
+
+    def run_legacy():
+        for entries in samples.values():
+            for entry in entries:
+                legacy_parse_date(entry['published'])
+
+    def run_strings():
+        for source, entries in samples.items():
+            for entry in entries:
+                normalizer.parse(entry['published'], source)
+
+    # Записи с кортежем published_parsed, который feedparser заполняет сам
+    parsed_entries = [
+        {'published_parsed': normalizer.parse(entry['published']).utctimetuple()}
+        for entries in samples.values() for entry in entries
+    ]
+
+    def run_parsed():
+        for entry in parsed_entries:
+            normalizer.normalize(entry)
+
+    print(f"Записей: {total}, повторов: {ROUNDS}")
+    for name, func in [('legacy strptime chain', run_legacy),
+                       ('DateNormalizer, strings', run_strings),
+                       ('DateNormalizer, published_parsed', run_parsed)]:
+        best = min(timeit.repeat(func, number=1, repeat=ROUNDS))
+        print(f"  {name:36s} {best * 1000:8.2f} ms  ({best / total * 1e6:6.2f} us/entry)")
+
+    # Проверка корректности: все даты в UTC и сортируются без ошибок
+    dates = [normalizer.parse(entries[0]['published'], source) for source, entries in samples.items()]
+    assert all(d.tzinfo is not None for d in dates)
+    sorted(dates)
+    print("Запомненные форматы:", normalizer.stats()['sources'])
+
+if __name__ == "__main__":
+    main()
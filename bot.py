@@ -1,12 +1,15 @@
 import logging
 from telegram import Update, ReplyKeyboardMarkup, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import TelegramError
 from telegram.ext import (
     Application, CommandHandler, MessageHandler, CallbackQueryHandler,
     ContextTypes, filters, ConversationHandler
 )
-from database import Database
+from admission import bind_request
 from channel_analyzer import ChannelAnalyzer
 from post_generator import PostGenerator
+from services import Services
+from stream_editor import StreamingMessageEditor
 from config import (
     TELEGRAM_BOT_TOKEN, WELCOME_MESSAGE, HELP_MESSAGE,
     MAIN_MENU_KEYBOARD, CHANNELS_MENU_KEYBOARD, GENERATE_MENU_KEYBOARD
@@ -18,20 +21,40 @@ WAITING_CHANNEL_ID, WAITING_TOPIC, WAITING_FREE_TOPIC, WAITING_FEEDBACK, WAITING
 logger = logging.getLogger(__name__)
 
 class PostAIBot:
-    def __init__(self):
+    def __init__(self, services: Services = None):
         if not TELEGRAM_BOT_TOKEN:
             raise ValueError("TELEGRAM_BOT_TOKEN not found in environment variables")
         
         self.application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
-        self.db = Database()
-        self.channel_analyzer = None  # Будет инициализирован в start_bot
-        self.post_generator = PostGenerator()
+        # Общие зависимости: одна база, один клиент Gemini, общие пулы, кэши и лимиты
+        self.services = services or Services()
+        self.db = self.services.db
+        self.post_generator = PostGenerator(db=self.db, gemini=self.services.gemini)
+        self.channel_analyzer = ChannelAnalyzer(
+            self.application.bot, db=self.db, gemini=self.services.gemini, post_buffer=self.services.post_buffer
+        )
         
         self._setup_handlers()
+
+    def _bind_admission(self, user_id: int, status_message=None):
+        """Учет запросов пользователя к модели; место в очереди показывается в status_message"""
+        async def show_queue_position(position: int):
+            try:
+                await status_message.edit_text(
+                    f"⏳ Сейчас много запросов. Ваше место в очереди: {position}\n"
+                    "Генерация начнется автоматически."
+                )
+            except TelegramError:
+                pass
+
+        bind_request(user_id, show_queue_position if status_message else None)
     
     def _setup_handlers(self):
         """Настройка обработчиков команд и сообщений"""
         
+        # Новые и отредактированные посты каналов - в локальное хранилище для анализа стиля
+        self.application.add_handler(MessageHandler(filters.UpdateType.CHANNEL_POSTS, self.handle_channel_post))
+
         # Основные команды
         self.application.add_handler(CommandHandler("start", self.start_command))
         self.application.add_handler(CommandHandler("help", self.help_command))
@@ -49,8 +72,8 @@ class PostAIBot:
             ],
             states={
                 WAITING_CHANNEL_ID: [
-                    MessageHandler(filters.TEXT & ~filters.COMMAND, self.add_channel_process),
-                    MessageHandler(filters.FORWARDED, self.add_channel_process)
+                    MessageHandler(filters.TEXT & ~filters.COMMAND, self.add_channel_process, block=False),
+                    MessageHandler(filters.FORWARDED, self.add_channel_process, block=False)
                 ]
             },
             fallbacks=[CommandHandler("cancel", self.cancel_operation)],
@@ -62,7 +85,7 @@ class PostAIBot:
         topic_conv = ConversationHandler(
             entry_points=[CallbackQueryHandler(self.topic_generation_start, pattern="^generate_topic_")],
             states={
-                WAITING_TOPIC: [MessageHandler(filters.TEXT & ~filters.COMMAND, self.generate_by_topic)]
+                WAITING_TOPIC: [MessageHandler(filters.TEXT & ~filters.COMMAND, self.generate_by_topic, block=False)]
             },
             fallbacks=[CommandHandler("cancel", self.cancel_operation)]
         )
@@ -72,7 +95,7 @@ class PostAIBot:
         free_topic_conv = ConversationHandler(
             entry_points=[CallbackQueryHandler(self.free_topic_start, pattern="^generate_free_")],
             states={
-                WAITING_FREE_TOPIC: [MessageHandler(filters.TEXT & ~filters.COMMAND, self.generate_free_topic)]
+                WAITING_FREE_TOPIC: [MessageHandler(filters.TEXT & ~filters.COMMAND, self.generate_free_topic, block=False)]
             },
             fallbacks=[CommandHandler("cancel", self.cancel_operation)]
         )
@@ -82,7 +105,7 @@ class PostAIBot:
         news_conv = ConversationHandler(
             entry_points=[CallbackQueryHandler(self.news_generation_start, pattern="^generate_news_")],
             states={
-                WAITING_NEWS_TOPIC: [MessageHandler(filters.TEXT & ~filters.COMMAND, self.generate_news_post)]
+                WAITING_NEWS_TOPIC: [MessageHandler(filters.TEXT & ~filters.COMMAND, self.generate_news_post, block=False)]
             },
             fallbacks=[CommandHandler("cancel", self.cancel_operation)]
         )
@@ -92,14 +115,14 @@ class PostAIBot:
         news_summary_conv = ConversationHandler(
             entry_points=[MessageHandler(filters.Regex("^📊 Сводка новостей$"), self.news_summary_start)],
             states={
-                WAITING_NEWS_SUMMARY_TOPIC: [MessageHandler(filters.TEXT & ~filters.COMMAND, self.generate_news_summary)]
+                WAITING_NEWS_SUMMARY_TOPIC: [MessageHandler(filters.TEXT & ~filters.COMMAND, self.generate_news_summary, block=False)]
             },
             fallbacks=[CommandHandler("cancel", self.cancel_operation)]
         )
         self.application.add_handler(news_summary_conv)
         
-        # Callback handlers
-        self.application.add_handler(CallbackQueryHandler(self.handle_callback))
+        # Callback handlers (неблокирующие: генерация не задерживает других пользователей)
+        self.application.add_handler(CallbackQueryHandler(self.handle_callback, block=False))
         
         # Обработчик пересланных сообщений
         self.application.add_handler(MessageHandler(filters.FORWARDED & ~filters.COMMAND, self.handle_forwarded_message))
@@ -112,17 +135,13 @@ class PostAIBot:
         user = update.effective_user
         
         # Добавляем пользователя в базу данных
-        self.db.add_user(
+        await self.db.add_user(
             user_id=user.id,
             username=user.username,
             first_name=user.first_name,
             last_name=user.last_name
         )
         
-        # Инициализируем анализатор каналов
-        if not self.channel_analyzer:
-            self.channel_analyzer = ChannelAnalyzer(context.bot)
-        
         keyboard = ReplyKeyboardMarkup(MAIN_MENU_KEYBOARD, resize_keyboard=True)
         
         await update.message.reply_text(
@@ -146,7 +165,7 @@ class PostAIBot:
     async def generate_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик команды /generate"""
         user_id = update.effective_user.id
-        channels = self.db.get_user_channels(user_id)
+        channels = await self.db.get_user_channels(user_id)
         
         if not channels:
             await update.message.reply_text(
@@ -164,7 +183,7 @@ class PostAIBot:
     async def settings_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик команды /settings"""
         user_id = update.effective_user.id
-        channels = self.db.get_user_channels(user_id)
+        channels = await self.db.get_user_channels(user_id)
         
         settings_text = f"""
 ⚙️ Настройки бота
@@ -242,7 +261,7 @@ class PostAIBot:
     async def show_generate_menu(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Показать меню генерации"""
         user_id = update.effective_user.id
-        channels = self.db.get_user_channels(user_id)
+        channels = await self.db.get_user_channels(user_id)
         
         if not channels:
             await update.message.reply_text(
@@ -282,7 +301,7 @@ class PostAIBot:
     async def show_channels_list(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Показать список каналов пользователя"""
         user_id = update.effective_user.id
-        channels = self.db.get_user_channels(user_id)
+        channels = await self.db.get_user_channels_with_styles(user_id)
 
         if not channels:
             await update.message.reply_text(
@@ -294,15 +313,13 @@ class PostAIBot:
         channels_text = "📋 Ваши каналы:\n\n"
 
         for i, channel in enumerate(channels, 1):
-            # Получаем информацию об анализе
-            style_info = self.db.get_style_analysis(channel['channel_id'])
-            status = "✅ Проанализирован" if style_info else "⏳ Требует анализа"
+            status = "✅ Проанализирован" if channel['is_analyzed'] else "⏳ Требует анализа"
 
             channels_text += f"{i}. **{channel['channel_name']}**\n"
             channels_text += f"   ID: `{channel['channel_id']}`\n"
             channels_text += f"   Статус: {status}\n"
-            if style_info:
-                channels_text += f"   Постов: {style_info['posts_count']}\n"
+            if channel['is_analyzed']:
+                channels_text += f"   Постов: {channel['posts_count']}\n"
             channels_text += f"   Добавлен: {channel['added_at'][:10]}\n\n"
 
         # Создаем inline клавиатуру для действий с каналами
@@ -326,7 +343,7 @@ class PostAIBot:
     async def show_update_analysis_menu(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Показать меню обновления анализа"""
         user_id = update.effective_user.id
-        channels = self.db.get_user_channels(user_id)
+        channels = await self.db.get_user_channels(user_id)
 
         if not channels:
             await update.message.reply_text(
@@ -363,7 +380,7 @@ class PostAIBot:
             context.user_data['generation_type'] = 'news_summary'
             return WAITING_NEWS_SUMMARY_TOPIC
 
-        channels = self.db.get_user_channels(user_id)
+        channels = await self.db.get_user_channels_with_styles(user_id)
 
         if not channels:
             await update.message.reply_text(
@@ -374,8 +391,7 @@ class PostAIBot:
         # Создаем клавиатуру с каналами
         keyboard = []
         for channel in channels:
-            style_info = self.db.get_style_analysis(channel['channel_id'])
-            if style_info:  # Только каналы с анализом
+            if channel['is_analyzed']:  # Только каналы с анализом
                 if generation_type == "🎯 По теме":
                     callback_data = f"generate_topic_{channel['channel_id']}"
                 elif generation_type == "🎲 Случайный пост":
@@ -417,8 +433,11 @@ class PostAIBot:
         """Обработчик callback запросов"""
         query = update.callback_query
         await query.answer()
+        self._bind_admission(query.from_user.id, query.message)
 
         data = query.data
+        # Кнопки "🔄 Еще" помечены суффиксом _more: нужен новый ответ, а не из кэша
+        fresh = data.endswith("_more")
 
         if data.startswith("update_analysis_"):
             channel_id = int(data.split("_")[2])
@@ -426,34 +445,11 @@ class PostAIBot:
 
         elif data.startswith("generate_random_"):
             channel_id = int(data.split("_")[2])
-            await self.generate_random_post(query, context, channel_id)
+            await self.generate_random_post(query, context, channel_id, fresh)
 
-        elif data.startswith("generate_topic_"):
-            channel_id = int(data.split("_")[2])
-            context.user_data['selected_channel'] = channel_id
-            await query.edit_message_text(
-                "🎯 Введите тему для поста:\n\n"
-                "Например: 'новости технологий', 'мотивация', 'обзор продукта'"
-            )
-            return WAITING_TOPIC
-
-        elif data.startswith("generate_free_"):
-            channel_id = int(data.split("_")[2])
-            context.user_data['selected_channel'] = channel_id
-            await query.edit_message_text(
-                "📝 Опишите, о чем должен быть пост:\n\n"
-                "Будьте максимально подробными в описании желаемого контента."
-            )
-            return WAITING_FREE_TOPIC
-
-        elif data.startswith("generate_news_"):
-            channel_id = int(data.split("_")[2])
-            context.user_data['selected_channel'] = channel_id
-            await query.edit_message_text(
-                "📰 Введите тему для поиска актуальных новостей:\n\n"
-                "Например: 'технологии', 'экономика', 'наука', 'спорт'"
-            )
-            return WAITING_NEWS_TOPIC
+        elif data.startswith("news_summary_"):
+            topic = data[len("news_summary_"):]
+            await self.refresh_news_summary(query, context, topic)
 
     async def add_channel_start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Начало процесса добавления канала"""
@@ -553,11 +549,9 @@ class PostAIBot:
             "🧠 Анализирую стиль написания\n\n"
             "⏳ Это может занять 1-2 минуты..."
         )
+        self._bind_admission(user_id, analyzing_msg)
 
         # Анализируем канал
-        if not self.channel_analyzer:
-            self.channel_analyzer = ChannelAnalyzer(context.bot)
-
         result = await self.channel_analyzer.analyze_channel(channel_id, user_id)
 
         await analyzing_msg.delete()
@@ -602,10 +596,24 @@ class PostAIBot:
 
         return ConversationHandler.END
 
+    async def _select_channel(self, update: Update, context: ContextTypes.DEFAULT_TYPE, prompt: str):
+        """Запоминает канал из кнопки и просит ввести тему; _more - нужен новый ответ, а не из кэша"""
+        query = update.callback_query
+        await query.answer()
+
+        data = query.data
+        context.user_data['selected_channel'] = int(data.split("_")[2])
+        context.user_data['fresh_generation'] = data.endswith("_more")
+        await query.edit_message_text(prompt)
+
     async def topic_generation_start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Начало генерации по теме"""
-        # Этот метод вызывается через callback, логика уже в handle_callback
-        pass
+        await self._select_channel(
+            update, context,
+            "🎯 Введите тему для поста:\n\n"
+            "Например: 'новости технологий', 'мотивация', 'обзор продукта'"
+        )
+        return WAITING_TOPIC
 
     async def generate_by_topic(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Генерация поста по теме"""
@@ -616,16 +624,18 @@ class PostAIBot:
             await update.message.reply_text("❌ Ошибка: канал не выбран.")
             return ConversationHandler.END
 
-        # Показываем сообщение о генерации
+        # Показываем сообщение о генерации и дописываем в него текст по мере готовности
         generating_msg = await update.message.reply_text(
             "✨ Генерирую пост по теме...\n"
             "Пожалуйста, подождите."
         )
+        self._bind_admission(update.effective_user.id, generating_msg)
+        editor = StreamingMessageEditor(generating_msg, render=lambda text: f"✨ Генерирую пост по теме...\n\n{text}")
 
-        # Генерируем пост
-        result = await self.post_generator.generate_post_by_topic(channel_id, topic)
-
-        await generating_msg.delete()
+        fresh = context.user_data.pop('fresh_generation', False)
+        result = await self.post_generator.stream_post(
+            channel_id, "topic", topic, fresh=fresh, on_update=editor.update
+        )
 
         if result['success']:
             post_text = f"""
@@ -638,28 +648,29 @@ class PostAIBot:
 """
             # Создаем клавиатуру для действий с постом
             keyboard = [
-                [InlineKeyboardButton("🔄 Сгенерировать еще", callback_data=f"generate_topic_{channel_id}")],
+                [InlineKeyboardButton("🔄 Сгенерировать еще", callback_data=f"generate_topic_{channel_id}_more")],
                 [InlineKeyboardButton("📝 Улучшить пост", callback_data=f"improve_post_{channel_id}")],
                 [InlineKeyboardButton("📋 Копировать", callback_data="copy_post")]
             ]
             reply_markup = InlineKeyboardMarkup(keyboard)
 
-            await update.message.reply_text(
-                post_text,
-                reply_markup=reply_markup,
-                parse_mode='Markdown'
-            )
+            await editor.finish(post_text, reply_markup=reply_markup)
         else:
-            await update.message.reply_text(
-                f"❌ Ошибка при генерации поста:\n{result['error']}"
+            await editor.finish(
+                f"❌ Ошибка при генерации поста:\n{result['error']}",
+                parse_mode=None
             )
 
         return ConversationHandler.END
 
     async def free_topic_start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Начало генерации свободной темы"""
-        # Логика уже в handle_callback
-        pass
+        await self._select_channel(
+            update, context,
+            "📝 Опишите, о чем должен быть пост:\n\n"
+            "Будьте максимально подробными в описании желаемого контента."
+        )
+        return WAITING_FREE_TOPIC
 
     async def generate_free_topic(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Генерация поста на свободную тему"""
@@ -674,10 +685,13 @@ class PostAIBot:
             "✨ Генерирую пост...\n"
             "Пожалуйста, подождите."
         )
+        self._bind_admission(update.effective_user.id, generating_msg)
+        editor = StreamingMessageEditor(generating_msg, render=lambda text: f"✨ Генерирую пост...\n\n{text}")
 
-        result = self.post_generator.generate_free_topic_post(channel_id, user_request)
-
-        await generating_msg.delete()
+        fresh = context.user_data.pop('fresh_generation', False)
+        result = await self.post_generator.stream_post(
+            channel_id, "free", user_request, fresh=fresh, on_update=editor.update
+        )
 
         if result['success']:
             post_text = f"""
@@ -689,32 +703,30 @@ class PostAIBot:
 📝 Запрос: {result['topic']}
 """
             keyboard = [
-                [InlineKeyboardButton("🔄 Сгенерировать еще", callback_data=f"generate_free_{channel_id}")],
+                [InlineKeyboardButton("🔄 Сгенерировать еще", callback_data=f"generate_free_{channel_id}_more")],
                 [InlineKeyboardButton("📝 Улучшить пост", callback_data=f"improve_post_{channel_id}")],
                 [InlineKeyboardButton("📋 Копировать", callback_data="copy_post")]
             ]
             reply_markup = InlineKeyboardMarkup(keyboard)
 
-            await update.message.reply_text(
-                post_text,
-                reply_markup=reply_markup,
-                parse_mode='Markdown'
-            )
+            await editor.finish(post_text, reply_markup=reply_markup)
         else:
-            await update.message.reply_text(
-                f"❌ Ошибка при генерации поста:\n{result['error']}"
+            await editor.finish(
+                f"❌ Ошибка при генерации поста:\n{result['error']}",
+                parse_mode=None
             )
 
         return ConversationHandler.END
 
-    async def generate_random_post(self, query, context: ContextTypes.DEFAULT_TYPE, channel_id: int):
+    async def generate_random_post(self, query, context: ContextTypes.DEFAULT_TYPE, channel_id: int, fresh: bool = False):
         """Генерация случайного поста"""
         await query.edit_message_text(
             "✨ Генерирую случайный пост...\n"
             "Пожалуйста, подождите."
         )
+        editor = StreamingMessageEditor(query.message, render=lambda text: f"✨ Генерирую случайный пост...\n\n{text}")
 
-        result = await self.post_generator.generate_random_post(channel_id)
+        result = await self.post_generator.stream_post(channel_id, "random", fresh=fresh, on_update=editor.update)
 
         if result['success']:
             post_text = f"""
@@ -726,20 +738,17 @@ class PostAIBot:
 🎲 Тема: {result['topic']}
 """
             keyboard = [
-                [InlineKeyboardButton("🔄 Еще случайный", callback_data=f"generate_random_{channel_id}")],
+                [InlineKeyboardButton("🔄 Еще случайный", callback_data=f"generate_random_{channel_id}_more")],
                 [InlineKeyboardButton("📝 Улучшить пост", callback_data=f"improve_post_{channel_id}")],
                 [InlineKeyboardButton("📋 Копировать", callback_data="copy_post")]
             ]
             reply_markup = InlineKeyboardMarkup(keyboard)
 
-            await query.edit_message_text(
-                post_text,
-                reply_markup=reply_markup,
-                parse_mode='Markdown'
-            )
+            await editor.finish(post_text, reply_markup=reply_markup)
         else:
-            await query.edit_message_text(
-                f"❌ Ошибка при генерации поста:\n{result['error']}"
+            await editor.finish(
+                f"❌ Ошибка при генерации поста:\n{result['error']}",
+                parse_mode=None
             )
 
     async def update_channel_analysis(self, query, context: ContextTypes.DEFAULT_TYPE, channel_id: int):
@@ -749,15 +758,17 @@ class PostAIBot:
             "Это может занять несколько минут."
         )
 
-        if not self.channel_analyzer:
-            self.channel_analyzer = ChannelAnalyzer(context.bot)
-
         result = await self.channel_analyzer.update_channel_analysis(channel_id)
 
-        if result['success']:
+        if result['success'] and result.get('skipped'):
+            await query.edit_message_text(
+                "✅ Новых постов нет - анализ стиля канала актуален."
+            )
+        elif result['success']:
             await query.edit_message_text(
                 f"✅ Анализ канала обновлен!\n\n"
                 f"📈 Проанализировано постов: {result['posts_analyzed']}\n"
+                f"📚 Всего постов в анализе: {result['posts_total']}\n"
                 f"🕐 Обновлено: {result['updated_at'].strftime('%d.%m.%Y %H:%M')}"
             )
         else:
@@ -777,9 +788,11 @@ class PostAIBot:
     async def start_bot(self):
         """Запуск бота"""
         logger.info("Starting PostAI Bot...")
+        await self.services.start()
         await self.application.initialize()
         await self.application.start()
-        await self.application.updater.start_polling()
+        # channel_post нужно запросить явно, иначе Telegram может их не присылать
+        await self.application.updater.start_polling(allowed_updates=Update.ALL_TYPES)
 
         logger.info("Bot is running...")
 
@@ -802,10 +815,17 @@ class PostAIBot:
         await self.application.stop()
         await self.application.shutdown()
 
+        # Опрос лент, буфер постов, клиент Gemini, пулы, кэши и база данных - только созданные
+        await self.services.close()
+
     async def news_generation_start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Начало генерации с новостями"""
-        # Логика уже в handle_callback
-        pass
+        await self._select_channel(
+            update, context,
+            "📰 Введите тему для поиска актуальных новостей:\n\n"
+            "Например: 'технологии', 'экономика', 'наука', 'спорт'"
+        )
+        return WAITING_NEWS_TOPIC
 
     async def generate_news_post(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Генерация поста с актуальными новостями"""
@@ -820,8 +840,10 @@ class PostAIBot:
             "📰 Ищу актуальные новости и генерирую пост...\n"
             "Это может занять немного больше времени."
         )
+        self._bind_admission(update.effective_user.id, generating_msg)
 
-        result = await self.post_generator.generate_news_based_post(channel_id, topic)
+        fresh = context.user_data.pop('fresh_generation', False)
+        result = await self.post_generator.generate_news_based_post(channel_id, topic, fresh=fresh)
 
         await generating_msg.delete()
 
@@ -836,7 +858,7 @@ class PostAIBot:
 📊 Тип: На основе новостей
 """
             keyboard = [
-                [InlineKeyboardButton("🔄 Обновить новости", callback_data=f"generate_news_{channel_id}")],
+                [InlineKeyboardButton("🔄 Обновить новости", callback_data=f"generate_news_{channel_id}_more")],
                 [InlineKeyboardButton("📝 Улучшить пост", callback_data=f"improve_post_{channel_id}")],
                 [InlineKeyboardButton("📋 Копировать", callback_data="copy_post")]
             ]
@@ -870,6 +892,7 @@ class PostAIBot:
             "📊 Ищу новости и создаю сводку...\n"
             "Пожалуйста, подождите."
         )
+        self._bind_admission(update.effective_user.id, generating_msg)
 
         result = await self.post_generator.get_news_summary(topic)
 
@@ -902,6 +925,40 @@ class PostAIBot:
 
         return ConversationHandler.END
 
+    async def refresh_news_summary(self, query, context: ContextTypes.DEFAULT_TYPE, topic: str):
+        """Обновление сводки новостей по кнопке (всегда новый ответ, без кэша)"""
+        await query.edit_message_text(
+            "📊 Обновляю сводку новостей...\n"
+            "Пожалуйста, подождите."
+        )
+
+        result = await self.post_generator.get_news_summary(topic, fresh=True)
+
+        if result['success']:
+            summary_text = f"""
+📊 **Сводка новостей:**
+
+{result['summary']}
+
+---
+🎯 Тема: {result['topic']}
+"""
+            keyboard = [
+                [InlineKeyboardButton("🔄 Обновить сводку", callback_data=f"news_summary_{topic}")],
+                [InlineKeyboardButton("📋 Копировать", callback_data="copy_post")]
+            ]
+            reply_markup = InlineKeyboardMarkup(keyboard)
+
+            await query.edit_message_text(
+                summary_text,
+                reply_markup=reply_markup,
+                parse_mode='Markdown'
+            )
+        else:
+            await query.edit_message_text(
+                f"❌ Ошибка при создании сводки новостей:\n{result['error']}"
+            )
+
     async def debug_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Команда для диагностики проблем"""
         user_id = update.effective_user.id
@@ -918,25 +975,26 @@ class PostAIBot:
 """
 
         # Получаем информацию о каналах пользователя
-        channels = self.db.get_user_channels(user_id)
+        channels = await self.db.get_user_channels_with_styles(user_id)
         if channels:
             for i, channel in enumerate(channels, 1):
-                style_info = self.db.get_style_analysis(channel['channel_id'])
-                status = "✅ Проанализирован" if style_info else "⏳ Требует анализа"
+                status = "✅ Проанализирован" if channel['is_analyzed'] else "⏳ Требует анализа"
                 debug_info += f"{i}. {channel['channel_name']}\n"
                 debug_info += f"   ID: {channel['channel_id']}\n"
                 debug_info += f"   Статус: {status}\n"
-                if style_info:
-                    debug_info += f"   Постов: {style_info['posts_count']}\n"
+                if channel['is_analyzed']:
+                    debug_info += f"   Постов: {channel['posts_count']}\n"
                 debug_info += "\n"
         else:
             debug_info += "Нет добавленных каналов\n"
 
+        cache_stats = self.services.feed_cache.stats()
         debug_info += f"""
 🤖 **Бот:**
 - Статус: Работает
 - База данных: Подключена
 - Gemini API: Настроен
+- Кэш лент: {cache_stats['entries']} лент, попаданий {cache_stats['hits']}, промахов {cache_stats['misses']}
 
 💡 **Советы:**
 - Для добавления канала используйте /channels
@@ -955,6 +1013,16 @@ class PostAIBot:
             "Бот покажет, как он обрабатывает ваш ввод."
         )
 
+    async def handle_channel_post(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Сохранение поста из канала (новый или отредактированный)"""
+        message = update.effective_message
+        content = message.text or message.caption
+        if not content:
+            return
+
+        # Для правки сохраняем новое содержимое под тем же post_id
+        self.services.post_buffer.add(message.chat_id, message.message_id, content, message.date)
+
     async def handle_forwarded_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработка пересланных сообщений"""
         if update.message.forward_from_chat:
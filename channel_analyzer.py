@@ -1,19 +1,22 @@
 import logging
-from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+from datetime import datetime
+from typing import List, Dict, Optional, Tuple
 from telegram import Bot
 from telegram.error import TelegramError
-from database import Database
+from admission import AdmissionRejected
+from async_database import AsyncDatabase
 from gemini_client import GeminiClient
+from services import get_default_services
 from config import MAX_POSTS_TO_ANALYZE, MIN_POSTS_FOR_ANALYSIS
 
 logger = logging.getLogger(__name__)
 
 class ChannelAnalyzer:
-    def __init__(self, bot: Bot):
+    def __init__(self, bot: Bot, db: AsyncDatabase = None, gemini: GeminiClient = None, post_buffer=None):
         self.bot = bot
-        self.db = Database()
-        self.gemini = GeminiClient()
+        self.db = db or get_default_services().db
+        self.gemini = gemini or get_default_services().gemini
+        self.post_buffer = post_buffer  # ChannelPostBuffer с еще не записанными постами
     
     async def analyze_channel(self, channel_id: int, user_id: int) -> Dict:
         """Полный анализ канала"""
@@ -40,37 +43,31 @@ class ChannelAnalyzer:
                     }
             
             # Добавляем канал в базу данных
-            self.db.add_channel(
+            await self.db.add_channel(
                 channel_id=channel_id,
                 channel_name=chat.title,
                 channel_username=chat.username,
                 user_id=user_id
             )
             
-            # Получаем посты канала
-            posts = await self._fetch_channel_posts(channel_id)
+            # Получаем посты канала и анализируем стиль
+            posts, style_analysis = await self._analyze_stored_posts(channel_id)
             
             if len(posts) < MIN_POSTS_FOR_ANALYSIS:
                 return {
                     'success': False,
-                    'error': f'Недостаточно постов для анализа. Минимум: {MIN_POSTS_FOR_ANALYSIS}, найдено: {len(posts)}'
+                    'error': (
+                        f'Недостаточно постов для анализа. Минимум: {MIN_POSTS_FOR_ANALYSIS}, найдено: {len(posts)}. '
+                        f'Бот сохраняет посты канала по мере их публикации - обновите анализ позже.'
+                    )
                 }
             
-            # Сохраняем посты в базу данных
-            self.db.add_posts(channel_id, posts)
-            
-            # Анализируем стиль
-            style_analysis = self.gemini.analyze_channel_style(posts)
-            
             if not style_analysis:
                 return {
                     'success': False,
                     'error': 'Ошибка при анализе стиля канала'
                 }
             
-            # Сохраняем анализ
-            self.db.save_style_analysis(channel_id, style_analysis, len(posts))
-            
             return {
                 'success': True,
                 'channel_name': chat.title,
@@ -103,6 +100,11 @@ class ChannelAnalyzer:
                     'success': False,
                     'error': f'Ошибка Telegram: {error_msg}'
                 }
+        except AdmissionRejected as e:
+            return {
+                'success': False,
+                'error': str(e)
+            }
         except Exception as e:
             logger.error(f"Error analyzing channel {channel_id}: {e}")
             return {
@@ -111,95 +113,15 @@ class ChannelAnalyzer:
             }
     
     async def _fetch_channel_posts(self, channel_id: int) -> List[Dict]:
-        """Получение постов из канала"""
-        posts = []
+        """Посты канала из локального хранилища (наполняется обработчиком channel_post)"""
         try:
-            logger.info(f"Attempting to fetch posts from channel {channel_id}")
-
-            # Пробуем получить последние сообщения
-            try:
-                # Получаем информацию о канале
-                chat = await self.bot.get_chat(channel_id)
-                logger.info(f"Channel info: {chat.title}, type: {chat.type}")
-
-                # Для каналов пробуем разные методы получения сообщений
-                if chat.type in ['channel', 'supergroup']:
-                    logger.info("Attempting to fetch messages from channel/supergroup")
-
-                    # Метод 1: Пробуем получить последние сообщения через message_id
-                    # Начинаем с большого числа и идем вниз
-                    for message_id in range(1000, 0, -1):
-                        try:
-                            # Пробуем получить сообщение
-                            message = await self.bot.get_chat_member(channel_id, self.bot.id)
-                            # Этот метод не работает для получения сообщений, но проверяет доступ
-                            break
-                        except Exception:
-                            continue
+            # Дописываем то, что еще лежит в буфере, чтобы анализ видел свежие посты
+            if self.post_buffer:
+                await self.post_buffer.flush()
 
-                    logger.info("Direct message fetching not available, using demo posts")
-
-            except Exception as e:
-                logger.warning(f"Could not fetch messages directly: {e}")
-
-            # Если не получилось получить посты, создаем демо-посты для тестирования
-            if len(posts) < MIN_POSTS_FOR_ANALYSIS:
-                logger.warning(f"Could not fetch enough posts from channel. Creating demo posts for analysis.")
-
-                # Получаем информацию о канале для более персонализированных демо-постов
-                try:
-                    chat = await self.bot.get_chat(channel_id)
-                    channel_name = chat.title
-                except:
-                    channel_name = "канал"
-
-                # Создаем демо-посты на основе типичного контента
-                demo_posts = [
-                    {
-                        'post_id': 1,
-                        'content': f'Добро пожаловать в {channel_name}! 👋 Здесь мы делимся интересными новостями и полезной информацией.',
-                        'date': datetime.now() - timedelta(days=1)
-                    },
-                    {
-                        'post_id': 2,
-                        'content': '🔥 Сегодня обсуждаем актуальные тренды в мире технологий. Что думаете об искусственном интеллекте?',
-                        'date': datetime.now() - timedelta(days=2)
-                    },
-                    {
-                        'post_id': 3,
-                        'content': '💡 Совет дня: всегда оставайтесь в курсе последних новостей! Подписывайтесь на наш канал.',
-                        'date': datetime.now() - timedelta(days=3)
-                    },
-                    {
-                        'post_id': 4,
-                        'content': '📊 Интересная статистика: 90% пользователей предпочитают качественный контент. А вы?',
-                        'date': datetime.now() - timedelta(days=4)
-                    },
-                    {
-                        'post_id': 5,
-                        'content': '🚀 Запускаем новую серию постов! Следите за обновлениями и не пропустите важную информацию.',
-                        'date': datetime.now() - timedelta(days=5)
-                    },
-                    {
-                        'post_id': 6,
-                        'content': '📈 Растем и развиваемся вместе! Спасибо всем подписчикам за поддержку и активность.',
-                        'date': datetime.now() - timedelta(days=6)
-                    },
-                    {
-                        'post_id': 7,
-                        'content': '🎯 Ставим новые цели и достигаем их! Какие у вас планы на ближайшее время?',
-                        'date': datetime.now() - timedelta(days=7)
-                    }
-                ]
-
-                posts.extend(demo_posts)
-                logger.info(f"Added {len(demo_posts)} demo posts for analysis based on channel: {channel_name}")
-
-            # Сортируем по дате (новые сначала)
-            posts.sort(key=lambda x: x['date'], reverse=True)
-
-            logger.info(f"Successfully collected {len(posts)} posts for analysis")
-            return posts[:MAX_POSTS_TO_ANALYZE]
+            posts = await self.db.get_channel_posts(channel_id, MAX_POSTS_TO_ANALYZE)
+            logger.info(f"Collected {len(posts)} stored posts of channel {channel_id} for analysis")
+            return posts
 
         except Exception as e:
             logger.error(f"Error fetching channel posts: {e}")
@@ -215,23 +137,46 @@ class ChannelAnalyzer:
             logger.warning(f"Could not fetch chat history: {e}")
             return []
     
+    async def _analyze_stored_posts(self, channel_id: int) -> Tuple[List[Dict], Optional[str]]:
+        """Анализ стиля по сохраненным постам и сохранение его вместе с отметкой учтенных постов.
+        Одновременные анализы канала получают одинаковый промпт и делят вызов модели в GeminiClient"""
+        posts = await self._fetch_channel_posts(channel_id)
+        if len(posts) < MIN_POSTS_FOR_ANALYSIS:
+            return posts, None
+
+        style_analysis = await self.gemini.analyze_channel_style(posts)
+        if style_analysis:
+            await self.db.save_style_analysis(
+                channel_id, style_analysis, len(posts),
+                analyzed_post_ids=[post['post_id'] for post in posts]
+            )
+        return posts, style_analysis
+
     async def update_channel_analysis(self, channel_id: int) -> Dict:
-        """Обновление анализа канала"""
+        """Обновление анализа канала: в модель уходят только новые посты"""
         try:
-            # Получаем новые посты
-            posts = await self._fetch_channel_posts(channel_id)
-            
-            if len(posts) < MIN_POSTS_FOR_ANALYSIS:
+            # Дописываем буфер: новые посты уже в базе, их собирает обработчик channel_post
+            if self.post_buffer:
+                await self.post_buffer.flush()
+
+            previous = await self.db.get_style_analysis(channel_id)
+            if not previous or not previous['style_analysis']:
+                # Анализа еще нет - делаем полный по сохраненным постам
+                return await self._full_reanalysis(channel_id)
+
+            new_posts = await self.db.get_unanalyzed_posts(channel_id, MAX_POSTS_TO_ANALYZE)
+            if not new_posts:
+                logger.info(f"No new posts in channel {channel_id}, style analysis is up to date")
                 return {
-                    'success': False,
-                    'error': 'Недостаточно постов для обновления анализа'
+                    'success': True,
+                    'skipped': True,
+                    'posts_analyzed': 0,
+                    'posts_total': previous['posts_count'] or 0,
+                    'updated_at': datetime.now()
                 }
-            
-            # Обновляем посты в базе данных
-            self.db.add_posts(channel_id, posts)
-            
-            # Повторный анализ стиля
-            style_analysis = self.gemini.analyze_channel_style(posts)
+
+            # Дополняем прежний анализ новыми постами
+            style_analysis = await self.gemini.update_channel_style(previous['style_analysis'], new_posts)
             
             if not style_analysis:
                 return {
@@ -239,12 +184,20 @@ class ChannelAnalyzer:
                     'error': 'Ошибка при обновлении анализа стиля'
                 }
             
-            # Сохраняем обновленный анализ
-            self.db.save_style_analysis(channel_id, style_analysis, len(posts))
+            # Сохраняем обновленный анализ; число учтенных постов база считает сама,
+            # иначе отредактированный пост (он снова не проанализирован) посчитался бы дважды
+            await self.db.save_style_analysis(
+                channel_id, style_analysis, None,
+                analyzed_post_ids=[post['post_id'] for post in new_posts]
+            )
+            logger.info(f"Incrementally updated style of channel {channel_id} with {len(new_posts)} new posts")
+            saved = await self.db.get_style_analysis(channel_id)
             
             return {
                 'success': True,
-                'posts_analyzed': len(posts),
+                'skipped': False,
+                'posts_analyzed': len(new_posts),
+                'posts_total': saved['posts_count'] if saved else len(new_posts),
                 'updated_at': datetime.now()
             }
             
@@ -255,15 +208,39 @@ class ChannelAnalyzer:
                 'error': str(e)
             }
     
-    def get_channel_info(self, channel_id: int) -> Optional[Dict]:
+    async def _full_reanalysis(self, channel_id: int) -> Dict:
+        """Полный анализ по постам из базы данных"""
+        posts, style_analysis = await self._analyze_stored_posts(channel_id)
+
+        if len(posts) < MIN_POSTS_FOR_ANALYSIS:
+            return {
+                'success': False,
+                'error': 'Недостаточно постов для обновления анализа'
+            }
+
+        if not style_analysis:
+            return {
+                'success': False,
+                'error': 'Ошибка при обновлении анализа стиля'
+            }
+
+        return {
+            'success': True,
+            'skipped': False,
+            'posts_analyzed': len(posts),
+            'posts_total': len(posts),
+            'updated_at': datetime.now()
+        }
+
+    async def get_channel_info(self, channel_id: int) -> Optional[Dict]:
         """Получение информации о канале"""
         try:
             # Получаем данные из базы
-            channels = self.db.get_user_channels(0)  # Временно, нужно исправить
+            channels = await self.db.get_user_channels(0)  # Временно, нужно исправить
             for channel in channels:
                 if channel['channel_id'] == channel_id:
                     # Получаем анализ стиля
-                    style_info = self.db.get_style_analysis(channel_id)
+                    style_info = await self.db.get_style_analysis(channel_id)
                     channel.update(style_info or {})
                     return channel
             return None
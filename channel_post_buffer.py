@@ -0,0 +1,97 @@
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Optional
+from news_dates import to_utc
+from config import CHANNEL_POSTS_FLUSH_SIZE, CHANNEL_POSTS_FLUSH_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+class ChannelPostBuffer:
+    """Буфер постов из каналов перед записью в базу данных.
+
+    Обработчик channel_post только кладет пост в память, а запись идет
+    пачками через add_posts_bulk: по заполнению буфера или по таймеру.
+    Правка поста до записи заменяет его версию в буфере.
+    """
+
+    def __init__(self, db, flush_size: int = CHANNEL_POSTS_FLUSH_SIZE,
+                 flush_interval: float = CHANNEL_POSTS_FLUSH_INTERVAL):
+        self.db = db
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+
+        self._pending = {}
+        self._task = None
+        self._flush_lock = None
+
+    def add(self, channel_id: int, post_id: int, content: str, date: Optional[datetime]):
+        """Постановка поста в очередь на запись"""
+        if not content:
+            return
+
+        self._pending[(channel_id, post_id)] = {
+            'post_id': post_id,
+            'content': content,
+            # В базе даты постов храним в UTC без пояса
+            'date': to_utc(date or datetime.now(timezone.utc)).replace(tzinfo=None)
+        }
+
+        if len(self._pending) >= self.flush_size:
+            asyncio.ensure_future(self.flush())
+
+    def start(self):
+        """Запуск периодической записи"""
+        if self._task and not self._task.done():
+            return
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        """Остановка таймера и запись остатка"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def flush(self) -> Dict[str, int]:
+        """Запись накопленных постов; возвращает счетчики вставок и обновлений"""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+
+        async with self._flush_lock:
+            if not self._pending:
+                return {'inserted': 0, 'updated': 0}
+
+            pending, self._pending = self._pending, {}
+            by_channel = {}
+            for (channel_id, _), post in pending.items():
+                by_channel.setdefault(channel_id, []).append(post)
+
+            totals = {'inserted': 0, 'updated': 0}
+            for channel_id, posts in by_channel.items():
+                stored = await self.db.add_posts_bulk(channel_id, posts)
+                if stored is None:
+                    # Не записалось - вернем в буфер, если туда еще не пришла новая версия
+                    for post in posts:
+                        self._pending.setdefault((channel_id, post['post_id']), post)
+                    continue
+                totals['inserted'] += stored['inserted']
+                totals['updated'] += stored['updated']
+
+            logger.info(f"Flushed channel posts: {totals['inserted']} inserted, {totals['updated']} updated")
+            return totals
+
+    async def _run(self):
+        """Периодическая запись буфера"""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error flushing channel posts: {e}")
@@ -11,17 +11,115 @@ GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
 
 # Database settings
 DATABASE_PATH = 'bot_database.db'
+DATABASE_CACHE_SIZE_KB = 16384  # Кэш страниц SQLite на соединение (16 МБ)
+DATABASE_MMAP_SIZE = 64 * 1024 * 1024  # Отображение файла БД в память (64 МБ)
+DATABASE_STATEMENT_CACHE_SIZE = 256  # Кэш подготовленных выражений на соединение
+DATABASE_BUSY_TIMEOUT = 5.0  # Секунды ожидания блокировки БД
+DATABASE_READER_THREADS = 4  # Потоки для чтения в AsyncDatabase
+DATABASE_WRITE_BATCH_SIZE = 100  # Максимум записей в одной групповой транзакции
+DATABASE_WRITE_BATCH_WINDOW = 0.005  # Секунды ожидания соседних записей для группировки
+POSTS_BULK_CHUNK_SIZE = 500  # Размер пачки при массовой загрузке постов
 
 # Bot settings
 MAX_POSTS_TO_ANALYZE = 50
+CHANNEL_POSTS_FLUSH_SIZE = 50  # Записывать посты из каналов пачками такого размера
+CHANNEL_POSTS_FLUSH_INTERVAL = 5  # или не реже, чем раз в столько секунд
+STREAM_EDIT_INTERVAL = 1.5  # Не чаще одной правки сообщения за столько секунд при потоковой генерации
+STREAM_MIN_CHARS_DELTA = 40  # Править, только если текст вырос хотя бы на столько символов
 MIN_POSTS_FOR_ANALYSIS = 5
 GEMINI_MODEL = 'gemini-2.5-flash'
+GEMINI_MAX_WORKERS = 8  # Размер пула потоков, если нет асинхронного клиента SDK
+GEMINI_VARIANTS_CONCURRENCY = 3  # Сколько вариантов поста генерируется одновременно
+
+# Бюджет промпта анализа стиля
+STYLE_PROMPT_TOKEN_BUDGET = 6000  # Токенов на примеры постов
+STYLE_PROMPT_MAX_POST_TOKENS = 600  # Длиннее - пост обрезается
+STYLE_PROMPT_MAX_POSTS = 30  # Больше постов в промпт не берем
+CHARS_PER_TOKEN = 3.5  # Оценка символов на токен для смеси русского и английского
+
+# Допуск запросов к Gemini
+GEMINI_MAX_CONCURRENT = 4  # Одновременных вызовов модели на весь бот
+GEMINI_QUEUE_MAX = 50  # Больше ожидающих - новые запросы сразу отклоняются
+GEMINI_QUEUE_TIMEOUT = 60  # Сколько секунд запрос может ждать в очереди
+USER_REQUESTS_PER_MINUTE = 6  # Действий пользователя с генерацией в минуту (варианты поста - одно действие)
+USER_REQUESTS_BURST = 3  # Сколько таких действий подряд можно сделать без ожидания
+
+# Повторы и дублирующие запросы к Gemini
+GEMINI_RETRY_ATTEMPTS = 3  # Попыток на один вызов при временных ошибках (5xx, 429, таймаут)
+GEMINI_RETRY_BASE_DELAY = 1  # Базовая пауза перед повтором, секунды (растет вдвое, со случайным разбросом)
+GEMINI_RETRY_MAX_DELAY = 8
+GEMINI_CALL_DEADLINE = 90  # Общий срок вызова со всеми повторами, секунды
+GEMINI_ATTEMPT_TIMEOUT = 45  # Срок одной попытки, секунды
+GEMINI_HEDGE_ENABLED = True  # Дублировать запрос, если ответ задерживается
+GEMINI_HEDGE_PERCENTILE = 95  # Дубль уходит, когда попытка дольше этого перцентиля задержки
+GEMINI_HEDGE_MIN_SAMPLES = 20  # До стольких замеров по операции дубли не отправляются
+GEMINI_HEDGE_MIN_DELAY = 2  # Не дублировать раньше, чем через столько секунд
+GEMINI_HEDGE_BUDGET = 0.05  # Доля попыток с дублем, не больше (при общем замедлении API нагрузка не удваивается)
+GEMINI_HEDGE_BUDGET_WINDOW = 200  # По скольким последним попыткам считается доля
+GEMINI_BREAKER_FAILURES = 5  # Временных ошибок подряд до отключения вызовов
+GEMINI_BREAKER_RESET_TIMEOUT = 30  # Через сколько секунд пробовать снова
+
+# Кэш ответов Gemini: время жизни по операциям, секунды (0 - не кэшировать)
+GEMINI_CACHE_TTLS = {
+    'analyze_style': 24 * 3600,
+    'update_style': 24 * 3600,
+    'summarize_news': 600,
+    'post': 300,
+    'improve_post': 300,
+    'random_post': 0,  # случайный пост каждый раз должен быть новым
+    'variant': 0  # варианты должны отличаться
+}
+GEMINI_CACHE_MAX_ENTRIES = 500  # Сколько ответов держать в памяти
+GEMINI_CACHE_PERSIST = True  # Хранить ответы также в SQLite
 
 # News search settings
 MAX_NEWS_ARTICLES = 10
 NEWS_SEARCH_TIMEOUT = 30
+RSS_FEED_TIMEOUT = 10  # Таймаут загрузки одной ленты, секунды
+NEWS_SEARCH_DEADLINE = 15  # Общий дедлайн параллельной загрузки лент, секунды
+NEWS_PROVIDER_DEADLINE = 17  # Дедлайн для каждого провайдера поиска по теме, секунды
+
+# Провайдеры поиска новостей по теме: опрашиваются параллельно.
+# weight - доля от запрошенного числа статей, которую может занять провайдер
+NEWS_PROVIDERS = {
+    'rss': {'enabled': True, 'weight': 0.5},
+    'google': {'enabled': True, 'weight': 0.5},
+    'yandex': {'enabled': True, 'weight': 0.5}
+}
 ENABLE_NEWS_SEARCH = True
 
+# Near-duplicate news clustering (MinHash + LSH)
+DEDUP_NUM_PERM = 64  # Длина MinHash сигнатуры
+DEDUP_BANDS = 16  # Полос LSH (num_perm должно делиться на это число)
+DEDUP_THRESHOLD = 0.5  # Сходство, начиная с которого статьи считаются одной новостью
+
+# Background news polling settings
+ENABLE_NEWS_POLLER = True
+NEWS_POLL_INTERVAL = 300  # Период опроса RSS лент, секунды
+NEWS_POLL_JITTER = 0.2  # Случайное отклонение периода (доля)
+NEWS_POLL_MAX_BACKOFF = 3600  # Максимальная пауза для ленты после ошибок, секунды
+ARTICLES_RETENTION_DAYS = 7  # Сколько дней хранить загруженные статьи
+NEWS_LOCAL_MIN_RESULTS = 3  # Если локально найдено меньше - идем в сеть
+NEWS_LOCAL_MAX_AGE_HOURS = 72  # Возраст статей для локального поиска, часы
+
+# Feed cache settings
+FEED_CACHE_TTL = 300  # Сколько секунд лента считается свежей
+FEED_CACHE_MAX_BYTES = 8 * 1024 * 1024  # Бюджет памяти кэша лент
+FEED_CACHE_PERSIST_LIMIT = 200  # Сколько лент поднимать из SQLite при старте
+FEED_CACHE_MAX_ENTRIES = 50  # Сколько статей ленты разбирать и хранить
+
+# HTTP client settings
+HTTP_POOL_LIMIT = 100  # Всего открытых соединений в пуле
+HTTP_POOL_LIMIT_PER_HOST = 8  # Соединений к одному хосту
+HTTP_DNS_CACHE_TTL = 300  # Время жизни кэша DNS, секунды
+HTTP_KEEPALIVE_TIMEOUT = 60  # Сколько держать простаивающее соединение, секунды
+HTTP_CONNECT_TIMEOUT = 5  # Таймаут установки соединения, секунды
+
+# Feed parsing settings
+FEED_PARSER_WORKERS = 2  # Потоков (процессов) для разбора RSS лент
+FEED_PARSER_MAX_PENDING = 16  # Сколько лент может ждать разбора одновременно
+FEED_PARSER_USE_PROCESSES = False  # Разбирать в процессах вместо потоков
+
 # RSS News sources
 RSS_SOURCES = [
     'https://feeds.bbci.co.uk/news/rss.xml',
@@ -1,88 +1,334 @@
 import sqlite3
 import logging
+import threading
+from contextlib import contextmanager
 from datetime import datetime
-from typing import List, Dict, Optional, Tuple
-from config import DATABASE_PATH
+from itertools import islice
+from typing import Iterable, Iterator, List, Dict, Optional, Tuple
+from text_search import topic_terms, build_fts_query
+from news_dates import UNKNOWN_DATE, to_utc
+from config import (
+    DATABASE_PATH, DATABASE_CACHE_SIZE_KB, DATABASE_MMAP_SIZE,
+    DATABASE_STATEMENT_CACHE_SIZE, DATABASE_BUSY_TIMEOUT, POSTS_BULK_CHUNK_SIZE
+)
 
 logger = logging.getLogger(__name__)
 
+def _chunked(items: Iterable, size: int) -> Iterator[List]:
+    """Разбиение итерируемого объекта на списки длиной не больше size"""
+    iterator = iter(items)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
 class Database:
-    def __init__(self):
-        self.db_path = DATABASE_PATH
+    def __init__(self, db_path: str = None):
+        self.db_path = db_path or DATABASE_PATH
+
+        # Соединения живут в потоке, который их открыл; asyncio-задачи одного
+        # потока делят одно соединение (методы класса не отдают управление)
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self._generation = 0
+        self._fts_trigram = None
+
         self.init_database()
-    
+
+    def _connect(self) -> sqlite3.Connection:
+        """Открытие и настройка нового соединения"""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=DATABASE_BUSY_TIMEOUT,
+            isolation_level=None,  # Транзакциями управляем сами, см. transaction()
+            check_same_thread=False,  # Нужно только для close() из другого потока
+            cached_statements=DATABASE_STATEMENT_CACHE_SIZE
+        )
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(f'PRAGMA cache_size=-{DATABASE_CACHE_SIZE_KB}')
+        conn.execute(f'PRAGMA mmap_size={DATABASE_MMAP_SIZE}')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        return conn
+
+    def get_connection(self) -> sqlite3.Connection:
+        """Постоянное соединение текущего потока"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.generation != self._generation:
+            conn = self._connect()
+            with self._connections_lock:
+                self._connections.append(conn)
+            self._local.conn = conn
+            self._local.generation = self._generation
+            self._local.depth = 0
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """Транзакция на соединении потока; вложенные вызовы используют SAVEPOINT"""
+        conn = self.get_connection()
+        depth = self._local.depth
+        savepoint = f'sp_{depth}'
+
+        conn.execute('BEGIN' if depth == 0 else f'SAVEPOINT {savepoint}')
+        self._local.depth = depth + 1
+        try:
+            yield conn
+        except BaseException:
+            if depth == 0:
+                conn.execute('ROLLBACK')
+            else:
+                conn.execute(f'ROLLBACK TO {savepoint}')
+                conn.execute(f'RELEASE {savepoint}')
+            raise
+        else:
+            conn.execute('COMMIT' if depth == 0 else f'RELEASE {savepoint}')
+        finally:
+            self._local.depth = depth
+
+    def close(self):
+        """Закрытие всех открытых соединений"""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+            self._generation += 1
+
+        for conn in connections:
+            try:
+                conn.close()
+            except Exception as e:
+                logger.warning(f"Error closing database connection: {e}")
+
+        if connections:
+            logger.info(f"Closed {len(connections)} database connection(s)")
+
     def init_database(self):
-        """Инициализация базы данных и создание таблиц"""
+        """Инициализация базы данных и применение миграций схемы"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                
-                # Таблица пользователей
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS users (
-                        user_id INTEGER PRIMARY KEY,
-                        username TEXT,
-                        first_name TEXT,
-                        last_name TEXT,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                ''')
-                
-                # Таблица каналов
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS channels (
-                        channel_id INTEGER PRIMARY KEY,
-                        channel_name TEXT NOT NULL,
-                        channel_username TEXT,
-                        user_id INTEGER NOT NULL,
-                        added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        is_active BOOLEAN DEFAULT 1,
-                        FOREIGN KEY (user_id) REFERENCES users (user_id)
-                    )
-                ''')
-                
-                # Таблица постов
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS posts (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        post_id INTEGER,
-                        channel_id INTEGER NOT NULL,
-                        content TEXT NOT NULL,
-                        post_date TIMESTAMP,
-                        analyzed BOOLEAN DEFAULT 0,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        FOREIGN KEY (channel_id) REFERENCES channels (channel_id)
-                    )
-                ''')
-                
-                # Таблица анализа стиля
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS channel_styles (
-                        channel_id INTEGER PRIMARY KEY,
-                        style_analysis TEXT,
-                        posts_count INTEGER DEFAULT 0,
-                        last_analysis TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        FOREIGN KEY (channel_id) REFERENCES channels (channel_id)
-                    )
-                ''')
-                
-                conn.commit()
-                logger.info("Database initialized successfully")
-                
+            conn = self.get_connection()
+            current_version = conn.execute('PRAGMA user_version').fetchone()[0]
+
+            for version, description, migration in self.MIGRATIONS:
+                if version <= current_version:
+                    continue
+
+                # Миграция и номер версии фиксируются в одной транзакции
+                with self.transaction() as conn:
+                    migration(self, conn.cursor())
+                    conn.execute(f'PRAGMA user_version = {version}')
+                logger.info(f"Applied database migration {version}: {description}")
+
+            logger.info("Database initialized successfully")
+
         except Exception as e:
             logger.error(f"Error initializing database: {e}")
             raise
-    
+
+    def _migrate_initial_schema(self, cursor: sqlite3.Cursor):
+        """Миграция 1: базовые таблицы"""
+        # Таблица пользователей
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS users (
+                user_id INTEGER PRIMARY KEY,
+                username TEXT,
+                first_name TEXT,
+                last_name TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
+        # Таблица каналов
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS channels (
+                channel_id INTEGER PRIMARY KEY,
+                channel_name TEXT NOT NULL,
+                channel_username TEXT,
+                user_id INTEGER NOT NULL,
+                added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                is_active BOOLEAN DEFAULT 1,
+                FOREIGN KEY (user_id) REFERENCES users (user_id)
+            )
+        ''')
+
+        # Таблица постов
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS posts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                post_id INTEGER,
+                channel_id INTEGER NOT NULL,
+                content TEXT NOT NULL,
+                post_date TIMESTAMP,
+                analyzed BOOLEAN DEFAULT 0,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (channel_id) REFERENCES channels (channel_id)
+            )
+        ''')
+
+        # Таблица анализа стиля
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS channel_styles (
+                channel_id INTEGER PRIMARY KEY,
+                style_analysis TEXT,
+                posts_count INTEGER DEFAULT 0,
+                last_analysis TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (channel_id) REFERENCES channels (channel_id)
+            )
+        ''')
+
+    def _migrate_posts_indexes(self, cursor: sqlite3.Cursor):
+        """Миграция 2: уникальность постов и индексы для выборок"""
+        # Разовая чистка дубликатов, накопленных INSERT OR REPLACE без уникального ключа:
+        # оставляем самую свежую запись для каждого (channel_id, post_id)
+        cursor.execute('''
+            DELETE FROM posts
+            WHERE post_id IS NOT NULL AND id NOT IN (
+                SELECT MAX(id) FROM posts
+                WHERE post_id IS NOT NULL
+                GROUP BY channel_id, post_id
+            )
+        ''')
+        if cursor.rowcount > 0:
+            logger.info(f"Removed {cursor.rowcount} duplicate posts")
+
+        cursor.execute('''
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_posts_channel_post
+            ON posts (channel_id, post_id)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_posts_channel_date
+            ON posts (channel_id, post_date DESC)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_channels_user
+            ON channels (user_id, is_active, added_at DESC)
+        ''')
+
+    def _migrate_feed_cache(self, cursor: sqlite3.Cursor):
+        """Миграция 3: постоянное хранилище кэша RSS лент"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS feed_cache (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                fetched_at REAL NOT NULL,
+                articles TEXT NOT NULL
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_feed_cache_fetched
+            ON feed_cache (fetched_at DESC)
+        ''')
+
+    def _migrate_articles(self, cursor: sqlite3.Cursor):
+        """Миграция 4: локальное хранилище новостных статей"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS articles (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                link TEXT NOT NULL UNIQUE,
+                title TEXT NOT NULL,
+                summary TEXT,
+                source TEXT,
+                feed_url TEXT,
+                published TIMESTAMP,
+                search_text TEXT NOT NULL,
+                fetched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_articles_published
+            ON articles (published DESC)
+        ''')
+
+    def _migrate_articles_fts(self, cursor: sqlite3.Cursor):
+        """Миграция 5: полнотекстовый индекс FTS5 по статьям"""
+        # trigram (SQLite 3.34+) ищет по подстроке и переживает падежные окончания;
+        # на старых версиях используем unicode61 с префиксными запросами
+        tokenizer = 'trigram' if self._fts_tokenizer_available(cursor, 'trigram') else 'unicode61 remove_diacritics 2'
+        cursor.execute(f'''
+            CREATE VIRTUAL TABLE IF NOT EXISTS articles_fts USING fts5(
+                title, summary,
+                content='articles', content_rowid='id',
+                tokenize='{tokenizer}'
+            )
+        ''')
+
+        # Индекс следует за таблицей articles через триггеры
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS articles_fts_insert AFTER INSERT ON articles BEGIN
+                INSERT INTO articles_fts (rowid, title, summary) VALUES (new.id, new.title, new.summary);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS articles_fts_delete AFTER DELETE ON articles BEGIN
+                INSERT INTO articles_fts (articles_fts, rowid, title, summary)
+                VALUES ('delete', old.id, old.title, old.summary);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS articles_fts_update AFTER UPDATE OF title, summary ON articles BEGIN
+                INSERT INTO articles_fts (articles_fts, rowid, title, summary)
+                VALUES ('delete', old.id, old.title, old.summary);
+                INSERT INTO articles_fts (rowid, title, summary) VALUES (new.id, new.title, new.summary);
+            END
+        ''')
+        cursor.execute("INSERT INTO articles_fts (articles_fts) VALUES ('rebuild')")
+
+    def _migrate_generation_cache(self, cursor: sqlite3.Cursor):
+        """Миграция 6: кэш ответов Gemini"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS generation_cache (
+                key TEXT PRIMARY KEY,
+                operation TEXT NOT NULL,
+                response TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_generation_cache_expires
+            ON generation_cache (expires_at)
+        ''')
+
+    @staticmethod
+    def _fts_tokenizer_available(cursor: sqlite3.Cursor, tokenizer: str) -> bool:
+        """Проверка поддержки токенизатора FTS5 текущей сборкой SQLite"""
+        try:
+            cursor.execute(f"CREATE VIRTUAL TABLE temp.fts_probe USING fts5(x, tokenize='{tokenizer}')")
+            cursor.execute("DROP TABLE temp.fts_probe")
+            return True
+        except sqlite3.OperationalError:
+            return False
+
+    def _fts_uses_trigram(self) -> bool:
+        """Каким токенизатором создан articles_fts (определяется один раз)"""
+        if self._fts_trigram is None:
+            row = self.get_connection().execute(
+                "SELECT sql FROM sqlite_master WHERE name = 'articles_fts'"
+            ).fetchone()
+            self._fts_trigram = bool(row and 'trigram' in row[0])
+        return self._fts_trigram
+
+    # Миграции схемы: (версия, описание, функция). Версия хранится в PRAGMA user_version,
+    # новые миграции добавляются только в конец списка
+    MIGRATIONS = [
+        (1, 'initial schema', _migrate_initial_schema),
+        (2, 'posts unique key and indexes', _migrate_posts_indexes),
+        (3, 'feed cache', _migrate_feed_cache),
+        (4, 'articles store', _migrate_articles),
+        (5, 'articles full-text index', _migrate_articles_fts),
+        (6, 'generation cache', _migrate_generation_cache),
+    ]
+
     def add_user(self, user_id: int, username: str = None, first_name: str = None, last_name: str = None) -> bool:
         """Добавление пользователя"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.transaction() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
                     INSERT OR REPLACE INTO users (user_id, username, first_name, last_name)
                     VALUES (?, ?, ?, ?)
                 ''', (user_id, username, first_name, last_name))
-                conn.commit()
                 return True
         except Exception as e:
             logger.error(f"Error adding user: {e}")
@@ -91,13 +337,12 @@ class Database:
     def add_channel(self, channel_id: int, channel_name: str, user_id: int, channel_username: str = None) -> bool:
         """Добавление канала"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.transaction() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
                     INSERT OR REPLACE INTO channels (channel_id, channel_name, channel_username, user_id)
                     VALUES (?, ?, ?, ?)
                 ''', (channel_id, channel_name, channel_username, user_id))
-                conn.commit()
                 return True
         except Exception as e:
             logger.error(f"Error adding channel: {e}")
@@ -106,78 +351,195 @@ class Database:
     def get_user_channels(self, user_id: int) -> List[Dict]:
         """Получение каналов пользователя"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    SELECT channel_id, channel_name, channel_username, added_at, is_active
-                    FROM channels 
-                    WHERE user_id = ? AND is_active = 1
-                    ORDER BY added_at DESC
-                ''', (user_id,))
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT channel_id, channel_name, channel_username, added_at, is_active
+                FROM channels 
+                WHERE user_id = ? AND is_active = 1
+                ORDER BY added_at DESC
+            ''', (user_id,))
                 
-                channels = []
-                for row in cursor.fetchall():
-                    channels.append({
-                        'channel_id': row[0],
-                        'channel_name': row[1],
-                        'channel_username': row[2],
-                        'added_at': row[3],
-                        'is_active': row[4]
-                    })
-                return channels
+            channels = []
+            for row in cursor.fetchall():
+                channels.append({
+                    'channel_id': row[0],
+                    'channel_name': row[1],
+                    'channel_username': row[2],
+                    'added_at': row[3],
+                    'is_active': row[4]
+                })
+            return channels
         except Exception as e:
             logger.error(f"Error getting user channels: {e}")
             return []
     
-    def add_posts(self, channel_id: int, posts: List[Dict]) -> bool:
+    def get_user_channels_with_styles(self, user_id: int, include_analysis: bool = False) -> List[Dict]:
+        """Получение каналов пользователя вместе со статусом анализа одним запросом"""
+        try:
+            # Текст анализа может быть большим - читаем его только по запросу
+            analysis_column = 'cs.style_analysis' if include_analysis else 'NULL'
+
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT c.channel_id, c.channel_name, c.channel_username, c.added_at, c.is_active,
+                       cs.channel_id IS NOT NULL, cs.posts_count, cs.last_analysis, {analysis_column}
+                FROM channels c
+                LEFT JOIN channel_styles cs ON cs.channel_id = c.channel_id
+                WHERE c.user_id = ? AND c.is_active = 1
+                ORDER BY c.added_at DESC
+            ''', (user_id,))
+
+            channels = []
+            for row in cursor.fetchall():
+                channel = {
+                    'channel_id': row[0],
+                    'channel_name': row[1],
+                    'channel_username': row[2],
+                    'added_at': row[3],
+                    'is_active': row[4],
+                    'is_analyzed': bool(row[5]),
+                    'posts_count': row[6],
+                    'last_analysis': row[7]
+                }
+                if include_analysis:
+                    channel['style_analysis'] = row[8]
+                channels.append(channel)
+            return channels
+        except Exception as e:
+            logger.error(f"Error getting user channels with styles: {e}")
+            return []
+
+    def add_posts(self, channel_id: int, posts: Iterable[Dict]) -> bool:
         """Добавление постов канала"""
+        return self.add_posts_bulk(channel_id, posts) is not None
+
+    def add_posts_bulk(self, channel_id: int, posts: Iterable[Dict], chunk_size: int = POSTS_BULK_CHUNK_SIZE) -> Optional[Dict]:
+        """Потоковая загрузка постов пачками в одной транзакции.
+
+        posts может быть генератором - в памяти держится только текущая пачка.
+        Возвращает {'inserted': ..., 'updated': ...} или None при ошибке.
+        """
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            inserted = 0
+            updated = 0
+
+            with self.transaction() as conn:
                 cursor = conn.cursor()
-                for post in posts:
-                    cursor.execute('''
-                        INSERT OR REPLACE INTO posts (post_id, channel_id, content, post_date)
+                for chunk in _chunked(posts, chunk_size):
+                    # Повторы внутри пачки схлопываем: побеждает последняя версия поста
+                    rows = {}
+                    for post in chunk:
+                        key = post['post_id'] if post['post_id'] is not None else object()
+                        rows[key] = (post['post_id'], channel_id, post['content'], post['date'])
+
+                    post_ids = [row[0] for row in rows.values() if row[0] is not None]
+                    existing = 0
+                    if post_ids:
+                        placeholders = ','.join('?' * len(post_ids))
+                        cursor.execute(f'''
+                            SELECT COUNT(*) FROM posts
+                            WHERE channel_id = ? AND post_id IN ({placeholders})
+                        ''', (channel_id, *post_ids))
+                        existing = cursor.fetchone()[0]
+
+                    # Измененный пост снова считается непроанализированным
+                    cursor.executemany('''
+                        INSERT INTO posts (post_id, channel_id, content, post_date)
                         VALUES (?, ?, ?, ?)
-                    ''', (post['post_id'], channel_id, post['content'], post['date']))
-                conn.commit()
-                return True
+                        ON CONFLICT (channel_id, post_id) DO UPDATE SET
+                            content = excluded.content,
+                            post_date = excluded.post_date,
+                            analyzed = CASE WHEN posts.content = excluded.content
+                                            THEN posts.analyzed ELSE 0 END
+                    ''', list(rows.values()))
+
+                    updated += existing
+                    inserted += len(rows) - existing
+
+            logger.info(f"Stored posts for channel {channel_id}: {inserted} inserted, {updated} updated")
+            return {'inserted': inserted, 'updated': updated}
         except Exception as e:
             logger.error(f"Error adding posts: {e}")
-            return False
-    
+            return None
+
     def get_channel_posts(self, channel_id: int, limit: int = 50) -> List[Dict]:
         """Получение постов канала"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    SELECT content, post_date FROM posts 
-                    WHERE channel_id = ? 
-                    ORDER BY post_date DESC 
-                    LIMIT ?
-                ''', (channel_id, limit))
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT content, post_date, post_id FROM posts 
+                WHERE channel_id = ? 
+                ORDER BY post_date DESC 
+                LIMIT ?
+            ''', (channel_id, limit))
                 
-                posts = []
-                for row in cursor.fetchall():
-                    posts.append({
-                        'content': row[0],
-                        'date': row[1]
-                    })
-                return posts
+            posts = []
+            for row in cursor.fetchall():
+                posts.append({
+                    'content': row[0],
+                    'date': row[1],
+                    'post_id': row[2]
+                })
+            return posts
         except Exception as e:
             logger.error(f"Error getting channel posts: {e}")
             return []
     
-    def save_style_analysis(self, channel_id: int, style_analysis: str, posts_count: int) -> bool:
-        """Сохранение анализа стиля канала"""
+    def get_unanalyzed_posts(self, channel_id: int, limit: int = 50) -> List[Dict]:
+        """Посты канала, еще не учтенные в анализе стиля (старые первыми)"""
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT post_id, content, post_date FROM posts
+                WHERE channel_id = ? AND analyzed = 0
+                ORDER BY post_date ASC
+                LIMIT ?
+            ''', (channel_id, limit))
+
+            posts = []
+            for row in cursor.fetchall():
+                posts.append({
+                    'post_id': row[0],
+                    'content': row[1],
+                    'date': row[2]
+                })
+            return posts
+        except Exception as e:
+            logger.error(f"Error getting unanalyzed posts: {e}")
+            return []
+
+    def save_style_analysis(self, channel_id: int, style_analysis: str, posts_count: Optional[int],
+                            analyzed_post_ids: Iterable[int] = None) -> bool:
+        """Сохранение анализа стиля канала; analyzed_post_ids - посты, учтенные в анализе.
+        posts_count=None - посчитать по отмеченным постам (измененный пост не учитывается дважды)"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.transaction() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
                     INSERT OR REPLACE INTO channel_styles (channel_id, style_analysis, posts_count, last_analysis)
                     VALUES (?, ?, ?, CURRENT_TIMESTAMP)
                 ''', (channel_id, style_analysis, posts_count))
-                conn.commit()
+
+                # Отметка постов - в той же транзакции, что и сам анализ
+                post_ids = [post_id for post_id in (analyzed_post_ids or []) if post_id is not None]
+                for chunk in _chunked(post_ids, POSTS_BULK_CHUNK_SIZE):
+                    placeholders = ','.join('?' * len(chunk))
+                    cursor.execute(f'''
+                        UPDATE posts SET analyzed = 1
+                        WHERE channel_id = ? AND post_id IN ({placeholders})
+                    ''', (channel_id, *chunk))
+
+                if posts_count is None:
+                    cursor.execute('''
+                        UPDATE channel_styles SET posts_count = (
+                            SELECT COUNT(*) FROM posts WHERE channel_id = ? AND analyzed = 1
+                        )
+                        WHERE channel_id = ?
+                    ''', (channel_id, channel_id))
                 return True
         except Exception as e:
             logger.error(f"Error saving style analysis: {e}")
@@ -186,22 +548,214 @@ class Database:
     def get_style_analysis(self, channel_id: int) -> Optional[Dict]:
         """Получение анализа стиля канала"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    SELECT style_analysis, posts_count, last_analysis 
-                    FROM channel_styles 
-                    WHERE channel_id = ?
-                ''', (channel_id,))
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT style_analysis, posts_count, last_analysis 
+                FROM channel_styles 
+                WHERE channel_id = ?
+            ''', (channel_id,))
                 
-                row = cursor.fetchone()
-                if row:
-                    return {
-                        'style_analysis': row[0],
-                        'posts_count': row[1],
-                        'last_analysis': row[2]
-                    }
-                return None
+            row = cursor.fetchone()
+            if row:
+                return {
+                    'style_analysis': row[0],
+                    'posts_count': row[1],
+                    'last_analysis': row[2]
+                }
+            return None
         except Exception as e:
             logger.error(f"Error getting style analysis: {e}")
             return None
+
+    def save_feed_cache_entry(self, url: str, etag: Optional[str], last_modified: Optional[str],
+                              fetched_at: float, articles: str) -> bool:
+        """Сохранение записи кэша RSS ленты"""
+        try:
+            with self.transaction() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    INSERT OR REPLACE INTO feed_cache (url, etag, last_modified, fetched_at, articles)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (url, etag, last_modified, fetched_at, articles))
+                return True
+        except Exception as e:
+            logger.error(f"Error saving feed cache entry: {e}")
+            return False
+
+    def get_feed_cache_entries(self, limit: int = 100) -> List[Dict]:
+        """Получение последних записей кэша RSS лент"""
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT url, etag, last_modified, fetched_at, articles
+                FROM feed_cache
+                ORDER BY fetched_at DESC
+                LIMIT ?
+            ''', (limit,))
+
+            entries = []
+            for row in cursor.fetchall():
+                entries.append({
+                    'url': row[0],
+                    'etag': row[1],
+                    'last_modified': row[2],
+                    'fetched_at': row[3],
+                    'articles': row[4]
+                })
+            return entries
+        except Exception as e:
+            logger.error(f"Error getting feed cache entries: {e}")
+            return []
+
+    def save_generation_cache_entry(self, key: str, operation: str, response: str, expires_at: float) -> bool:
+        """Сохранение ответа Gemini в кэш"""
+        try:
+            with self.transaction() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    INSERT OR REPLACE INTO generation_cache (key, operation, response, expires_at)
+                    VALUES (?, ?, ?, ?)
+                ''', (key, operation, response, expires_at))
+                return True
+        except Exception as e:
+            logger.error(f"Error saving generation cache entry: {e}")
+            return False
+
+    def get_generation_cache_entry(self, key: str, now: float) -> Optional[Dict]:
+        """Получение непросроченного ответа Gemini из кэша"""
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT response, expires_at FROM generation_cache
+                WHERE key = ? AND expires_at > ?
+            ''', (key, now))
+
+            row = cursor.fetchone()
+            if row:
+                return {'response': row[0], 'expires_at': row[1]}
+            return None
+        except Exception as e:
+            logger.error(f"Error getting generation cache entry: {e}")
+            return None
+
+    def prune_generation_cache(self, now: float) -> int:
+        """Удаление просроченных ответов Gemini"""
+        try:
+            with self.transaction() as conn:
+                cursor = conn.cursor()
+                cursor.execute('DELETE FROM generation_cache WHERE expires_at <= ?', (now,))
+                return cursor.rowcount
+        except Exception as e:
+            logger.error(f"Error pruning generation cache: {e}")
+            return 0
+
+    def add_articles(self, feed_url: str, articles: Iterable[Dict]) -> int:
+        """Сохранение статей из ленты; возвращает число новых или измененных строк"""
+        try:
+            rows = []
+            for article in articles:
+                title = article.get('title') or ''
+                summary = article.get('summary') or ''
+                # Статьи без ссылки идентифицируем по ленте и заголовку
+                link = article.get('link') or f"{feed_url}#{title}"
+                # Храним в UTC без пояса, чтобы сравнение с datetime('now') было корректным
+                published = to_utc(article.get('published'))
+                published = published.replace(tzinfo=None).isoformat(sep=' ') if published != UNKNOWN_DATE else None
+                rows.append((
+                    link, title, summary, article.get('source'), feed_url, published,
+                    f"{title}\n{summary}".lower()
+                ))
+
+            if not rows:
+                return 0
+
+            with self.transaction() as conn:
+                cursor = conn.cursor()
+                # rowcount, а не total_changes: триггеры articles_fts тоже пишут строки
+                cursor.executemany('''
+                    INSERT INTO articles (link, title, summary, source, feed_url, published, search_text)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (link) DO UPDATE SET
+                        title = excluded.title,
+                        summary = excluded.summary,
+                        published = COALESCE(excluded.published, articles.published),
+                        search_text = excluded.search_text
+                    WHERE articles.title != excluded.title OR articles.summary != excluded.summary
+                ''', rows)
+                return max(cursor.rowcount, 0)
+        except Exception as e:
+            logger.error(f"Error adding articles: {e}")
+            return 0
+
+    def search_articles(self, topic: str, limit: int = 10, max_age_hours: int = None) -> List[Dict]:
+        """Поиск статей по теме: полнотекстовый индекс с ранжированием BM25"""
+        try:
+            age_condition = ''
+            age_params = []
+            if max_age_hours:
+                age_condition = "AND (a.published IS NULL OR a.published >= datetime('now', ?))"
+                age_params.append(f'-{int(max_age_hours)} hours')
+
+            conn = self.get_connection()
+            cursor = conn.cursor()
+
+            terms = topic_terms(topic)
+            if terms:
+                # Совпадение в заголовке весит больше, чем в описании
+                cursor.execute(f'''
+                    SELECT a.title, a.summary, a.link, a.source, a.published
+                    FROM articles_fts
+                    JOIN articles a ON a.id = articles_fts.rowid
+                    WHERE articles_fts MATCH ? {age_condition}
+                    ORDER BY bm25(articles_fts, 5.0, 1.0)
+                    LIMIT ?
+                ''', [build_fts_query(terms, self._fts_uses_trigram()), *age_params, limit])
+            else:
+                # Слишком короткая тема для индекса (например, "AI") - ищем подстроку
+                cursor.execute(f'''
+                    SELECT a.title, a.summary, a.link, a.source, a.published
+                    FROM articles a
+                    WHERE instr(a.search_text, ?) > 0 {age_condition}
+                    ORDER BY a.published DESC
+                    LIMIT ?
+                ''', [topic.lower(), *age_params, limit])
+
+            return [self._article_from_row(row) for row in cursor.fetchall()]
+        except Exception as e:
+            logger.error(f"Error searching articles: {e}")
+            return []
+
+    def prune_articles(self, older_than_days: int) -> int:
+        """Удаление устаревших статей"""
+        try:
+            with self.transaction() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    DELETE FROM articles
+                    WHERE fetched_at < datetime('now', ?)
+                ''', (f'-{int(older_than_days)} days',))
+                return cursor.rowcount
+        except Exception as e:
+            logger.error(f"Error pruning articles: {e}")
+            return 0
+
+    @staticmethod
+    def _article_from_row(row: Tuple) -> Dict:
+        """Статья из строки таблицы articles в формате NewsSearcher"""
+        published = UNKNOWN_DATE
+        if row[4]:
+            try:
+                published = to_utc(datetime.fromisoformat(row[4]))
+            except ValueError:
+                pass
+        return {
+            'title': row[0],
+            'summary': row[1] or '',
+            'link': row[2] if row[2].startswith('http') else '',
+            'source': row[3],
+            'published': published,
+            'type': 'local'
+        }
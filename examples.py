@@ -107,7 +107,7 @@ async def example_gemini_usage():
         ]
 
         print("🔍 Анализирую стиль постов...")
-        style_analysis = gemini.analyze_channel_style(test_posts)
+        style_analysis = await gemini.analyze_channel_style(test_posts)
 
         if style_analysis:
             print("✅ Анализ стиля завершен:")
@@ -240,7 +240,7 @@ async def example_post_generator():
         
         # Генерируем пост по теме
         print("🎯 Генерирую пост по теме...")
-        result = generator.generate_post_by_topic(channel_id, "машинное обучение")
+        result = await generator.generate_post_by_topic(channel_id, "машинное обучение")
         
         if result['success']:
             print("✅ Пост по теме сгенерирован:")
@@ -250,7 +250,7 @@ async def example_post_generator():
         
         # Генерируем случайный пост
         print("\n🎲 Генерирую случайный пост...")
-        result = generator.generate_random_post(channel_id)
+        result = await generator.generate_random_post(channel_id)
         
         if result['success']:
             print("✅ Случайный пост сгенерирован:")
@@ -0,0 +1,196 @@
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import List, Dict, Optional, Tuple
+from news_dates import to_utc
+from config import FEED_CACHE_TTL, FEED_CACHE_MAX_BYTES, FEED_CACHE_PERSIST_LIMIT
+
+logger = logging.getLogger(__name__)
+
+class FeedCache:
+    """Общий кэш разобранных RSS лент с ключом по URL.
+
+    Свежие записи (моложе TTL) отдаются без сети, устаревшие используются
+    для условного GET (If-None-Match / If-Modified-Since). Объем ограничен
+    бюджетом памяти с вытеснением по LRU. При переданной базе данных записи
+    сохраняются в SQLite, чтобы после перезапуска кэш был теплым.
+    """
+
+    def __init__(self, ttl: float = FEED_CACHE_TTL, max_bytes: int = FEED_CACHE_MAX_BYTES, db=None):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.db = db  # AsyncDatabase или None для кэша только в памяти
+
+        self._entries = OrderedDict()
+        self._size = 0
+        self._pending_writes = set()
+
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.evictions = 0
+
+    def lookup(self, url: str) -> Tuple[Optional[Dict], bool]:
+        """Поиск ленты в кэше: (запись или None, свежая ли она)"""
+        entry = self._entries.get(url)
+        if entry is None:
+            self.misses += 1
+            return None, False
+
+        self._entries.move_to_end(url)
+        if time.time() - entry['fetched_at'] < self.ttl:
+            self.hits += 1
+            return entry, True
+
+        # Устаревшая запись пригодится для условного запроса
+        self.misses += 1
+        return entry, False
+
+    def conditional_headers(self, entry: Optional[Dict]) -> Dict[str, str]:
+        """Заголовки для условного GET по сохраненной записи (только если есть что вернуть при 304)"""
+        headers = {}
+        if entry and entry.get('articles') is not None:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def put(self, url: str, articles: List[Dict], etag: str = None, last_modified: str = None):
+        """Сохранение свежезагруженной ленты"""
+        entry = {
+            'articles': articles,
+            'etag': etag,
+            'last_modified': last_modified,
+            'fetched_at': time.time(),
+            'size': self._estimate_size(url, articles)
+        }
+        self._store(url, entry)
+        self._persist(url, entry)
+
+    def mark_revalidated(self, url: str) -> Optional[Dict]:
+        """Сервер ответил 304: продлеваем жизнь записи"""
+        entry = self._entries.get(url)
+        if entry is None:
+            return None
+
+        self.revalidations += 1
+        entry['fetched_at'] = time.time()
+        self._entries.move_to_end(url)
+        self._persist(url, entry)
+        return entry
+
+    def stats(self) -> Dict:
+        """Счетчики кэша"""
+        total = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'bytes': self._size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'revalidations': self.revalidations,
+            'evictions': self.evictions
+        }
+
+    async def load(self):
+        """Прогрев кэша из SQLite"""
+        if not self.db:
+            return
+
+        rows = await self.db.get_feed_cache_entries(FEED_CACHE_PERSIST_LIMIT)
+        # Строки приходят от новых к старым: вставляем в обратном порядке, чтобы LRU был верным
+        for row in reversed(rows):
+            try:
+                articles = self._deserialize(row['articles'])
+            except (ValueError, TypeError) as e:
+                logger.warning(f"Skipping corrupted feed cache entry {row['url']}: {e}")
+                continue
+
+            self._store(row['url'], {
+                'articles': articles,
+                'etag': row['etag'],
+                'last_modified': row['last_modified'],
+                'fetched_at': row['fetched_at'],
+                'size': self._estimate_size(row['url'], articles)
+            })
+
+        logger.info(f"Feed cache warmed with {len(self._entries)} feeds")
+
+    async def flush(self):
+        """Ожидание незавершенных записей в SQLite"""
+        if self._pending_writes:
+            await asyncio.gather(*self._pending_writes, return_exceptions=True)
+
+    def _store(self, url: str, entry: Dict):
+        """Помещение записи в память с учетом бюджета"""
+        old = self._entries.pop(url, None)
+        if old:
+            self._size -= old['size']
+
+        self._entries[url] = entry
+        self._size += entry['size']
+
+        # Вытесняем самые давно использованные ленты, но не только что добавленную
+        while self._size > self.max_bytes and len(self._entries) > 1:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= evicted['size']
+            self.evictions += 1
+
+    def _persist(self, url: str, entry: Dict):
+        """Фоновая запись в SQLite, не задерживает запрос пользователя"""
+        if not self.db:
+            return
+
+        try:
+            task = asyncio.ensure_future(self.db.save_feed_cache_entry(
+                url, entry['etag'], entry['last_modified'], entry['fetched_at'],
+                self._serialize(entry['articles'])
+            ))
+        except RuntimeError:
+            # Нет запущенного event loop (например, синхронный вызов из скрипта)
+            return
+
+        self._pending_writes.add(task)
+        task.add_done_callback(self._pending_writes.discard)
+
+    @staticmethod
+    def _estimate_size(url: str, articles: List[Dict]) -> int:
+        """Грубая оценка занимаемой памяти в байтах"""
+        size = len(url) + 200
+        for article in articles:
+            size += 200  # накладные расходы словаря
+            for value in article.values():
+                if isinstance(value, str):
+                    size += len(value)
+        return size
+
+    @staticmethod
+    def _serialize(articles: List[Dict]) -> str:
+        """Статьи в JSON (даты - в ISO формате)"""
+        def default(value):
+            if isinstance(value, datetime):
+                return {'__datetime__': value.isoformat()}
+            raise TypeError(f"Unsupported type: {type(value).__name__}")
+        return json.dumps(articles, ensure_ascii=False, default=default)
+
+    @staticmethod
+    def _deserialize(data: str) -> List[Dict]:
+        """Статьи из JSON"""
+        def object_hook(value):
+            if '__datetime__' in value:
+                return to_utc(datetime.fromisoformat(value['__datetime__']))
+            return value
+        return json.loads(data, object_hook=object_hook)
+
+_default_feed_cache = None
+
+def get_default_feed_cache() -> FeedCache:
+    """Общий кэш в памяти для NewsSearcher, созданных без явного кэша"""
+    global _default_feed_cache
+    if _default_feed_cache is None:
+        _default_feed_cache = FeedCache()
+    return _default_feed_cache
@@ -0,0 +1,93 @@
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import List, Dict, Union
+import feedparser
+from bs4 import BeautifulSoup
+from news_dates import normalize_entry_date
+from config import FEED_PARSER_WORKERS, FEED_PARSER_MAX_PENDING, FEED_PARSER_USE_PROCESSES
+
+logger = logging.getLogger(__name__)
+
+def clean_html(text: str) -> str:
+    """Текст без HTML разметки"""
+    if not text or '<' not in text:
+        return text or ''
+    return BeautifulSoup(text, 'html.parser').get_text(' ', strip=True)
+
+def parse_feed(content: Union[bytes, str], url: str, max_entries: int) -> List[Dict]:
+    """Разбор RSS ленты в список статей (выполняется в рабочем потоке или процессе)"""
+    feed = feedparser.parse(content)
+    source = feed.feed.get('title', url)
+    articles = []
+
+    for entry in feed.entries[:max_entries]:
+        articles.append({
+            'title': clean_html(entry.get('title', 'No title')),
+            'summary': clean_html(entry.get('summary', entry.get('description', ''))),
+            'link': entry.get('link', ''),
+            'published': normalize_entry_date(entry, url),
+            'source': source,
+            'type': 'rss'
+        })
+
+    return articles
+
+class FeedParserPool:
+    """Разбор лент вне event loop.
+
+    feedparser и BeautifulSoup работают синхронно и на больших лентах
+    занимают заметное время, поэтому разбор идет в пуле потоков (или
+    процессов). Число заданий в работе и в очереди ограничено: лишние
+    вызовы ждут своей очереди, а не копят память.
+    """
+
+    def __init__(self, workers: int = FEED_PARSER_WORKERS, max_pending: int = FEED_PARSER_MAX_PENDING,
+                 use_processes: bool = FEED_PARSER_USE_PROCESSES):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.use_processes = use_processes
+
+        self._executor = None
+        self._slots = None
+
+    def _get_executor(self) -> Executor:
+        """Пул создается при первом разборе"""
+        if self._executor is None:
+            if self.use_processes:
+                # spawn: в процессе уже есть потоки (база данных, HTTP), fork небезопасен
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers,
+                    thread_name_prefix='feed-parser'
+                )
+        return self._executor
+
+    async def parse(self, content: Union[bytes, str], url: str, max_entries: int) -> List[Dict]:
+        """Разбор ленты в пуле с ограничением глубины очереди"""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_pending)
+
+        async with self._slots:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), parse_feed, content, url, max_entries)
+
+    def close(self):
+        """Остановка пула"""
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+_default_feed_parser = None
+
+def get_default_feed_parser() -> FeedParserPool:
+    """Общий пул разбора для NewsSearcher, созданных без явного пула"""
+    global _default_feed_parser
+    if _default_feed_parser is None:
+        _default_feed_parser = FeedParserPool()
+    return _default_feed_parser
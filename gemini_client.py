@@ -1,31 +1,221 @@
+import asyncio
+import functools
+import inspect
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
 from google import genai
 from google.genai import types
-import logging
-from typing import List, Dict, Optional
-from config import GEMINI_API_KEY, GEMINI_MODEL
+from typing import AsyncIterator, List, Dict, Optional, Tuple
+from config import GEMINI_API_KEY, GEMINI_MODEL, GEMINI_MAX_WORKERS, GEMINI_VARIANTS_CONCURRENCY
+from admission import AdmissionController, AdmissionRejected
+from generation_cache import GenerationCache
 from news_searcher import NewsSearcher
+from prompt_builder import StylePromptBuilder, estimate_tokens
+from resilience import ResilientCaller, is_retryable
+from single_flight import SingleFlight
 
 logger = logging.getLogger(__name__)
 
 class GeminiClient:
-    def __init__(self):
+    def __init__(self, news_searcher: NewsSearcher = None, cache: GenerationCache = None,
+                 admission: AdmissionController = None, resilience: ResilientCaller = None):
         if not GEMINI_API_KEY:
             raise ValueError("GEMINI_API_KEY not found in environment variables")
 
         # Инициализируем новый клиент
         self.client = genai.Client(api_key=GEMINI_API_KEY)
         self.model_name = GEMINI_MODEL
-        self.news_searcher = None
+        self.news_searcher = news_searcher
+        self.cache = cache or GenerationCache()
+        self.admission = admission or AdmissionController()
+        self.resilience = resilience or ResilientCaller(admission=self.admission)  # Повторы, дубли запросов, предохранитель
+        self._inflight = SingleFlight()  # Одинаковые одновременные вызовы модели (ключ кэша)
+        self.prompt_builder = StylePromptBuilder()
+
+        # Асинхронный клиент SDK, если он есть; иначе ограниченный пул потоков
+        aio = getattr(self.client, 'aio', None)
+        self._aio_models = getattr(aio, 'models', None)
+        self._executor = None
+        if self._aio_models is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=GEMINI_MAX_WORKERS,
+                thread_name_prefix='gemini'
+            )
         logger.info(f"Gemini client initialized with model: {GEMINI_MODEL}")
-    
-    def analyze_channel_style(self, posts: List[Dict]) -> Optional[str]:
+
+    def _generation_config(self) -> types.GenerateContentConfig:
+        """Конфигурация генерации по умолчанию"""
+        return types.GenerateContentConfig(
+            thinking_config=types.ThinkingConfig(thinking_budget=0)  # Отключаем thinking для скорости
+        )
+
+    async def _generate(self, prompt: str, operation: str = None, fresh: bool = False) -> Optional[str]:
+        """Вызов модели с кэшем ответов; fresh=True - всегда новый ответ (кнопки "🔄 Еще")"""
+        config = self._generation_config()
+
+        use_cache = operation is not None and self.cache.enabled(operation)
+        if use_cache:
+            key = self.cache.make_key(self.model_name, prompt, config)
+            if not fresh:
+                cached = await self.cache.get(operation, key)
+                if cached is not None:
+                    logger.info(f"Gemini cache hit for {operation}")
+                    return cached
+
+        # Одинаковые вызовы склеиваются, но каждый пользователь сам проходит лимит и
+        # очередь: присоединиться можно только к вызову, уже допущенному к модели
+        coalesce = use_cache and not fresh
+        if coalesce:
+            shared = self._inflight.running(key)
+            if shared is not None:
+                self.admission.charge()
+                return await asyncio.shield(shared)
+
+        shared = None
+        async with self.admission.slot():
+            if coalesce:
+                # Пока запрос стоял в очереди, такой же вызов мог начаться или закончиться
+                shared = self._inflight.running(key)
+                cached = await self.cache.get(operation, key) if shared is None else None
+                if cached is not None:
+                    return cached
+            if shared is None:
+                call = lambda: self.resilience.call(lambda: self._call_model(prompt, config), operation)
+                text = await (self._inflight.do(key, call) if coalesce else call())
+                if use_cache and text:
+                    self.cache.put(operation, key, text)
+                return text
+
+        # Слот не нужен - ответ придет от уже идущего вызова
+        return await asyncio.shield(shared)
+
+    async def _call_model(self, prompt: str, config: types.GenerateContentConfig) -> Optional[str]:
+        """Вызов модели без блокировки event loop"""
+        if self._aio_models is not None:
+            response = await self._aio_models.generate_content(
+                model=self.model_name,
+                contents=prompt,
+                config=config
+            )
+        else:
+            loop = asyncio.get_running_loop()
+            response = await loop.run_in_executor(
+                self._executor,
+                functools.partial(
+                    self.client.models.generate_content,
+                    model=self.model_name,
+                    contents=prompt,
+                    config=config
+                )
+            )
+        return response.text
+
+    async def _generate_stream(self, prompt: str, operation: str = None, fresh: bool = False) -> AsyncIterator[str]:
+        """Потоковый вызов модели: отдает фрагменты текста по мере генерации"""
+        config = self._generation_config()
+
+        use_cache = operation is not None and self.cache.enabled(operation)
+        if use_cache:
+            key = self.cache.make_key(self.model_name, prompt, config)
+            if not fresh:
+                cached = await self.cache.get(operation, key)
+                if cached is not None:
+                    logger.info(f"Gemini cache hit for {operation}")
+                    yield cached
+                    return
+
+        if self._aio_models is None:
+            # Без асинхронного клиента потоковой передачи нет - отдаем ответ целиком
+            async with self.admission.slot():
+                text = await self.resilience.call(lambda: self._call_model(prompt, config), operation)
+            if text:
+                if use_cache:
+                    self.cache.put(operation, key, text)
+                yield text
+            return
+
+        parts = []
+        started = time.monotonic()
+        # Слот занят, пока идет поток: это один вызов модели
+        async with self.admission.slot():
+            # Повторяется только открытие потока: после первых фрагментов
+            # повтор продублировал бы уже показанный текст
+            stream, first = await self.resilience.call(
+                lambda: self._open_stream(prompt, config), hedge=False
+            )
+            if first is None:
+                return
+
+            if first.text:
+                parts.append(first.text)
+                yield first.text
+            # Остаток потока укладывается в общий срок вызова: зависший поток не держит слот
+            deadline = started + self.resilience.deadline
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(
+                        stream.__anext__(), timeout=max(0.0, deadline - time.monotonic())
+                    )
+                except StopAsyncIteration:
+                    break
+                except Exception as e:
+                    if is_retryable(e):
+                        self.resilience.breaker.record_failure()
+                    logger.error(f"Gemini stream failed after {time.monotonic() - started:.1f}s: {e!r}")
+                    await self._close_stream(stream)
+                    raise
+                if chunk.text:
+                    parts.append(chunk.text)
+                    yield chunk.text
+
+        if use_cache and parts:
+            self.cache.put(operation, key, ''.join(parts))
+
+    async def _open_stream(self, prompt: str, config: types.GenerateContentConfig):
+        """Открытие потока: запрос уходит при получении первого фрагмента"""
+        stream = self._aio_models.generate_content_stream(
+            model=self.model_name,
+            contents=prompt,
+            config=config
+        )
+        if inspect.isawaitable(stream):
+            stream = await stream
+
+        try:
+            first = await stream.__anext__()
+        except StopAsyncIteration:
+            first = None
+        return stream, first
+
+    @staticmethod
+    async def _close_stream(stream):
+        """Закрытие прерванного потока, чтобы не держать соединение"""
+        aclose = getattr(stream, 'aclose', None)
+        if aclose is None:
+            return
+        try:
+            await aclose()
+        except Exception as e:
+            logger.debug(f"Error closing Gemini stream: {e!r}")
+
+    async def close(self):
+        """Освобождение ресурсов клиента"""
+        if self.news_searcher:
+            await self.news_searcher.close()
+        if self._executor:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    async def analyze_channel_style(self, posts: List[Dict], fresh: bool = False) -> Optional[str]:
         """Анализ стиля постов канала"""
         try:
             if not posts:
                 return None
 
-            # Подготавливаем текст постов для анализа
-            posts_text = "\n\n---\n\n".join([post['content'] for post in posts[:30]])
+            # Подбираем разнообразные посты в пределах бюджета токенов
+            posts_text, used = self.prompt_builder.build_posts_block(posts)
+            logger.info(f"Style analysis prompt: {used} of {len(posts)} posts, ~{estimate_tokens(posts_text)} tokens")
 
             prompt = f"""
 Проанализируй стиль написания постов в Telegram канале. Вот примеры постов:
@@ -45,39 +235,71 @@ class GeminiClient:
 Результат должен быть структурированным описанием стиля, который можно использовать для генерации похожих постов.
 """
 
-            response = self.client.models.generate_content(
-                model=self.model_name,
-                contents=prompt,
-                config=types.GenerateContentConfig(
-                    thinking_config=types.ThinkingConfig(thinking_budget=0)  # Отключаем thinking для скорости
-                )
-            )
-            return response.text
+            return await self._generate(prompt, 'analyze_style', fresh)
+
+        except AdmissionRejected:
+            raise
 
         except Exception as e:
             logger.error(f"Error analyzing channel style: {e}")
             return None
     
-    async def generate_post(self, style_analysis: str, topic: str = None, post_type: str = "general", include_news: bool = False) -> Optional[str]:
-        """Генерация поста в стиле канала с возможностью включения новостей"""
+    async def update_channel_style(self, style_analysis: str, new_posts: List[Dict], fresh: bool = False) -> Optional[str]:
+        """Дополнение существующего анализа стиля новыми постами"""
         try:
-            # Получаем актуальные новости если нужно
-            news_context = ""
-            if include_news and topic:
-                news_context = await self._get_news_context(topic)
-
-            if post_type == "random":
-                topic_prompt = "Придумай интересную и актуальную тему для поста."
-            elif post_type == "topic" and topic:
-                topic_prompt = f"Тема поста: {topic}"
-            elif post_type == "free" and topic:
-                topic_prompt = f"Напиши пост на тему: {topic}"
-            elif post_type == "news" and topic:
-                topic_prompt = f"Создай пост на основе актуальных новостей по теме: {topic}"
-            else:
-                topic_prompt = "Создай интересный пост на актуальную тему."
+            if not new_posts:
+                return style_analysis
+
+            posts_text, used = self.prompt_builder.build_posts_block(new_posts)
+            logger.info(f"Style update prompt: {used} of {len(new_posts)} new posts, ~{estimate_tokens(posts_text)} tokens")
 
             prompt = f"""
+Ниже - ранее составленный анализ стиля Telegram канала и новые посты, опубликованные после него.
+
+ТЕКУЩИЙ АНАЛИЗ СТИЛЯ:
+{style_analysis}
+
+НОВЫЕ ПОСТЫ:
+{posts_text}
+
+Обнови анализ с учетом новых постов:
+1. Сохрани структуру и разделы текущего анализа
+2. Уточни пункты, в которых новые посты показывают изменения (тон, длина, эмодзи, форматирование, темы)
+3. Не удаляй наблюдения, которые новые посты не опровергают
+4. Если новые посты ничего не меняют, верни текущий анализ без изменений
+
+Результат - полный обновленный анализ стиля, пригодный для генерации похожих постов.
+"""
+
+            return await self._generate(prompt, 'update_style', fresh)
+
+        except AdmissionRejected:
+            raise
+
+        except Exception as e:
+            logger.error(f"Error updating channel style: {e}")
+            return None
+
+    async def _build_post_prompt(self, style_analysis: str, topic: str = None, post_type: str = "general",
+                                 include_news: bool = False) -> str:
+        """Промпт генерации поста в стиле канала"""
+        # Получаем актуальные новости если нужно
+        news_context = ""
+        if include_news and topic:
+            news_context = await self._get_news_context(topic)
+
+        if post_type == "random":
+            topic_prompt = "Придумай интересную и актуальную тему для поста."
+        elif post_type == "topic" and topic:
+            topic_prompt = f"Тема поста: {topic}"
+        elif post_type == "free" and topic:
+            topic_prompt = f"Напиши пост на тему: {topic}"
+        elif post_type == "news" and topic:
+            topic_prompt = f"Создай пост на основе актуальных новостей по теме: {topic}"
+        else:
+            topic_prompt = "Создай интересный пост на актуальную тему."
+
+        prompt = f"""
 На основе анализа стиля канала создай новый пост:
 
 АНАЛИЗ СТИЛЯ КАНАЛА:
@@ -100,21 +322,32 @@ class GeminiClient:
 
 Создай ОДИН пост, готовый к публикации в Telegram канале.
 """
+        return prompt
 
-            response = self.client.models.generate_content(
-                model=self.model_name,
-                contents=prompt,
-                config=types.GenerateContentConfig(
-                    thinking_config=types.ThinkingConfig(thinking_budget=0)
-                )
-            )
-            return response.text
+    async def generate_post(self, style_analysis: str, topic: str = None, post_type: str = "general",
+                            include_news: bool = False, fresh: bool = False) -> Optional[str]:
+        """Генерация поста в стиле канала с возможностью включения новостей"""
+        try:
+            prompt = await self._build_post_prompt(style_analysis, topic, post_type, include_news)
+            operation = 'random_post' if post_type == "random" else 'post'
+            return await self._generate(prompt, operation, fresh)
+
+        except AdmissionRejected:
+            raise
 
         except Exception as e:
             logger.error(f"Error generating post: {e}")
             return None
     
-    def improve_post(self, post_content: str, style_analysis: str, feedback: str) -> Optional[str]:
+    async def stream_post(self, style_analysis: str, topic: str = None, post_type: str = "general",
+                          include_news: bool = False, fresh: bool = False) -> AsyncIterator[str]:
+        """Потоковая генерация поста: фрагменты текста по мере готовности"""
+        prompt = await self._build_post_prompt(style_analysis, topic, post_type, include_news)
+        operation = 'random_post' if post_type == "random" else 'post'
+        async for chunk in self._generate_stream(prompt, operation, fresh):
+            yield chunk
+
+    async def improve_post(self, post_content: str, style_analysis: str, feedback: str, fresh: bool = False) -> Optional[str]:
         """Улучшение поста на основе обратной связи"""
         try:
             prompt = f"""
@@ -132,14 +365,10 @@ class GeminiClient:
 Перепиши пост, учитывая замечания и сохраняя стиль канала.
 """
 
-            response = self.client.models.generate_content(
-                model=self.model_name,
-                contents=prompt,
-                config=types.GenerateContentConfig(
-                    thinking_config=types.ThinkingConfig(thinking_budget=0)
-                )
-            )
-            return response.text
+            return await self._generate(prompt, 'improve_post', fresh)
+
+        except AdmissionRejected:
+            raise
 
         except Exception as e:
             logger.error(f"Error improving post: {e}")
@@ -148,15 +377,33 @@ class GeminiClient:
     async def generate_multiple_variants(self, style_analysis: str, topic: str, count: int = 3, include_news: bool = False) -> List[str]:
         """Генерация нескольких вариантов поста"""
         try:
-            # Получаем новости если нужно
-            news_context = ""
-            if include_news:
-                news_context = await self._get_news_context(topic)
+            results = []
+            async for index, text in self.iter_variants(style_analysis, topic, count, include_news):
+                results.append((index, text))
+
+            # Сохраняем исходный порядок вариантов
+            return [text for _, text in sorted(results)]
 
-            variants = []
-            for i in range(count):
-                prompt = f"""
-На основе анализа стиля канала создай вариант #{i+1} поста:
+        except AdmissionRejected:
+            raise
+
+        except Exception as e:
+            logger.error(f"Error generating multiple variants: {e}")
+            return []
+
+    async def iter_variants(self, style_analysis: str, topic: str, count: int = 3,
+                            include_news: bool = False, concurrency: int = None) -> AsyncIterator[Tuple[int, str]]:
+        """Параллельная генерация вариантов: результаты отдаются по мере готовности"""
+        # Получаем новости если нужно
+        news_context = ""
+        if include_news:
+            news_context = await self._get_news_context(topic)
+
+        semaphore = asyncio.Semaphore(concurrency or GEMINI_VARIANTS_CONCURRENCY)
+
+        async def generate_variant(index: int) -> Tuple[int, Optional[str]]:
+            prompt = f"""
+На основе анализа стиля канала создай вариант #{index + 1} поста:
 
 АНАЛИЗ СТИЛЯ:
 {style_analysis}
@@ -168,21 +415,34 @@ class GeminiClient:
 Создай уникальный пост, отличающийся от предыдущих вариантов, но в том же стиле.
 Если предоставлены новости, используй разные аспекты или подходы к освещению темы.
 """
-                response = self.client.models.generate_content(
-                    model=self.model_name,
-                    contents=prompt,
-                    config=types.GenerateContentConfig(
-                        thinking_config=types.ThinkingConfig(thinking_budget=0)
-                    )
-                )
-                if response.text:
-                    variants.append(response.text)
-
-            return variants
+            async with semaphore:
+                return index, await self._generate(prompt, 'variant')
 
-        except Exception as e:
-            logger.error(f"Error generating multiple variants: {e}")
-            return []
+        tasks = [asyncio.ensure_future(generate_variant(i)) for i in range(count)]
+        rejected = None
+        produced = 0
+        try:
+            for future in asyncio.as_completed(tasks):
+                try:
+                    index, text = await future
+                except AdmissionRejected as e:
+                    rejected = e
+                    continue
+                except Exception as e:
+                    # Ошибка одного варианта не отменяет остальные
+                    logger.warning(f"Error generating post variant: {e}")
+                    continue
+
+                if text:
+                    produced += 1
+                    yield index, text
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        # Ни один вариант не допущен к модели - сообщаем причину
+        if rejected and not produced:
+            raise rejected
 
     async def _get_news_context(self, topic: str) -> str:
         """Получение контекста новостей по теме"""
@@ -190,8 +450,8 @@ class GeminiClient:
             if not self.news_searcher:
                 self.news_searcher = NewsSearcher()
 
-            async with self.news_searcher as searcher:
-                articles = await searcher.search_news_by_topic(topic, max_results=5)
+            # Поисковик живет вместе с клиентом: соединения переиспользуются между вызовами
+            articles = await self.news_searcher.search_news_by_topic(topic, max_results=5)
 
             if not articles:
                 return ""
@@ -209,27 +469,29 @@ class GeminiClient:
             logger.error(f"Error getting news context: {e}")
             return ""
 
-    async def generate_news_based_post(self, style_analysis: str, topic: str) -> Optional[str]:
+    async def generate_news_based_post(self, style_analysis: str, topic: str, fresh: bool = False) -> Optional[str]:
         """Генерация поста на основе актуальных новостей"""
         try:
             return await self.generate_post(
                 style_analysis=style_analysis,
                 topic=topic,
                 post_type="news",
-                include_news=True
+                include_news=True,
+                fresh=fresh
             )
+        except AdmissionRejected:
+            raise
         except Exception as e:
             logger.error(f"Error generating news-based post: {e}")
             return None
 
-    async def summarize_news(self, topic: str, max_articles: int = 5) -> Optional[str]:
+    async def summarize_news(self, topic: str, max_articles: int = 5, fresh: bool = False) -> Optional[str]:
         """Создание сводки новостей по теме"""
         try:
             if not self.news_searcher:
                 self.news_searcher = NewsSearcher()
 
-            async with self.news_searcher as searcher:
-                articles = await searcher.search_news_by_topic(topic, max_articles)
+            articles = await self.news_searcher.search_news_by_topic(topic, max_articles)
 
             if not articles:
                 return f"По теме '{topic}' актуальных новостей не найдено."
@@ -258,14 +520,10 @@ class GeminiClient:
 Создай сводку в формате для Telegram канала.
 """
 
-            response = self.client.models.generate_content(
-                model=self.model_name,
-                contents=prompt,
-                config=types.GenerateContentConfig(
-                    thinking_config=types.ThinkingConfig(thinking_budget=0)
-                )
-            )
-            return response.text
+            return await self._generate(prompt, 'summarize_news', fresh)
+
+        except AdmissionRejected:
+            raise
 
         except Exception as e:
             logger.error(f"Error summarizing news: {e}")
@@ -0,0 +1,124 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+from config import GEMINI_CACHE_TTLS, GEMINI_CACHE_MAX_ENTRIES
+
+logger = logging.getLogger(__name__)
+
+class GenerationCache:
+    """Кэш ответов Gemini с ключом по отпечатку запроса.
+
+    Ключ - хэш модели, промпта и конфигурации генерации, поэтому совпадают
+    только действительно одинаковые запросы (например, повторный анализ
+    тех же постов или сводка по той же теме из тех же новостей). Время
+    жизни задается для каждой операции отдельно, объем в памяти ограничен
+    по LRU. С базой данных ответы дополнительно хранятся в SQLite.
+    """
+
+    def __init__(self, ttls: Dict[str, float] = None, max_entries: int = GEMINI_CACHE_MAX_ENTRIES, db=None):
+        self.ttls = dict(GEMINI_CACHE_TTLS if ttls is None else ttls)
+        self.max_entries = max_entries
+        self.db = db  # AsyncDatabase или None для кэша только в памяти
+
+        self._entries = OrderedDict()
+        self._pending_writes = set()
+
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(model: str, prompt: str, config=None) -> str:
+        """Отпечаток запроса: хэш модели, промпта и конфигурации"""
+        if config is None:
+            config_repr = ''
+        elif hasattr(config, 'model_dump'):
+            config_repr = json.dumps(config.model_dump(exclude_none=True), sort_keys=True, default=str)
+        else:
+            config_repr = repr(config)
+
+        digest = hashlib.sha256()
+        for part in (model, config_repr, prompt):
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    def enabled(self, operation: str) -> bool:
+        """Кэшируется ли операция"""
+        return self.ttls.get(operation, 0) > 0
+
+    async def get(self, operation: str, key: str) -> Optional[str]:
+        """Сохраненный ответ или None"""
+        if not self.enabled(operation):
+            return None
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry['expires_at'] > time.time():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry['response']
+            del self._entries[key]
+
+        if self.db:
+            try:
+                row = await self.db.get_generation_cache_entry(key, time.time())
+            except Exception as e:
+                logger.warning(f"Generation cache lookup failed: {e}")
+                row = None
+            if row:
+                self._store(key, row['response'], row['expires_at'])
+                self.hits += 1
+                return row['response']
+
+        self.misses += 1
+        return None
+
+    def put(self, operation: str, key: str, response: str):
+        """Сохранение ответа с временем жизни операции"""
+        if not self.enabled(operation) or not response:
+            return
+
+        expires_at = time.time() + self.ttls[operation]
+        self._store(key, response, expires_at)
+        self._persist(operation, key, response, expires_at)
+
+    def stats(self) -> Dict:
+        """Счетчики кэша"""
+        total = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0
+        }
+
+    async def flush(self):
+        """Ожидание незавершенных записей в SQLite"""
+        if self._pending_writes:
+            await asyncio.gather(*self._pending_writes, return_exceptions=True)
+
+    def _store(self, key: str, response: str, expires_at: float):
+        """Помещение ответа в память с вытеснением по LRU"""
+        self._entries.pop(key, None)
+        self._entries[key] = {'response': response, 'expires_at': expires_at}
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _persist(self, operation: str, key: str, response: str, expires_at: float):
+        """Фоновая запись в SQLite"""
+        if not self.db:
+            return
+
+        try:
+            task = asyncio.ensure_future(
+                self.db.save_generation_cache_entry(key, operation, response, expires_at)
+            )
+        except RuntimeError:
+            return
+
+        self._pending_writes.add(task)
+        task.add_done_callback(self._pending_writes.discard)
@@ -0,0 +1,66 @@
+import logging
+import aiohttp
+from typing import Optional
+from config import (
+    NEWS_SEARCH_TIMEOUT, HTTP_POOL_LIMIT, HTTP_POOL_LIMIT_PER_HOST,
+    HTTP_DNS_CACHE_TTL, HTTP_KEEPALIVE_TIMEOUT, HTTP_CONNECT_TIMEOUT
+)
+
+logger = logging.getLogger(__name__)
+
+class HttpClient:
+    """Долгоживущая aiohttp сессия с общим пулом соединений.
+
+    Создается один раз на приложение: повторные запросы к одним и тем же
+    лентам идут по уже открытым keep-alive соединениям без новых TCP и TLS
+    рукопожатий, а адреса берутся из кэша DNS. Сессия создается лениво,
+    так как aiohttp требует запущенный event loop.
+    """
+
+    def __init__(self, timeout: float = NEWS_SEARCH_TIMEOUT, limit: int = HTTP_POOL_LIMIT,
+                 limit_per_host: int = HTTP_POOL_LIMIT_PER_HOST,
+                 dns_cache_ttl: int = HTTP_DNS_CACHE_TTL,
+                 keepalive_timeout: float = HTTP_KEEPALIVE_TIMEOUT):
+        self.timeout = timeout
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_cache_ttl = dns_cache_ttl
+        self.keepalive_timeout = keepalive_timeout
+
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """Общая сессия (создается при первом обращении)"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                ttl_dns_cache=self.dns_cache_ttl,
+                keepalive_timeout=self.keepalive_timeout
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout, connect=HTTP_CONNECT_TIMEOUT)
+            )
+            logger.info(
+                f"HTTP session opened (limit={self.limit}, per host={self.limit_per_host}, "
+                f"keep-alive={self.keepalive_timeout}s)"
+            )
+        return self._session
+
+    @property
+    def closed(self) -> bool:
+        """Закрыта ли сессия"""
+        return self._session is None or self._session.closed
+
+    async def start(self):
+        """Открытие сессии при запуске приложения"""
+        self.session
+
+    async def close(self):
+        """Закрытие сессии и всех соединений пула"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            logger.info("HTTP session closed")
+        self._session = None
@@ -0,0 +1,118 @@
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, List, Optional
+
+# Дата статьи, которую не удалось определить: при сортировке оказывается в конце
+UNKNOWN_DATE = datetime.min.replace(tzinfo=timezone.utc)
+
+def to_utc(value: Optional[datetime]) -> datetime:
+    """Дата в UTC с часовым поясом (даты без пояса считаются UTC)"""
+    if value is None:
+        return UNKNOWN_DATE
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    if value == UNKNOWN_DATE:
+        return value
+    return value.astimezone(timezone.utc)
+
+def from_struct_time(value: time.struct_time) -> datetime:
+    """Дата из кортежа feedparser (*_parsed всегда в UTC)"""
+    return datetime(*value[:6], tzinfo=timezone.utc)
+
+def sort_by_date(articles: List[Dict], reverse: bool = True) -> List[Dict]:
+    """Сортировка статей по дате публикации (по умолчанию - новые первыми)"""
+    return sorted(articles, key=lambda article: article.get('published') or UNKNOWN_DATE, reverse=reverse)
+
+class DateNormalizer:
+    """Приведение дат из RSS к UTC.
+
+    Сначала используется уже разобранный feedparser кортеж published_parsed,
+    затем строка даты. Формат, который подошел для источника, запоминается
+    и пробуется первым: внутри одной ленты даты обычно в одном формате.
+    """
+
+    FORMATS = [
+        '%a, %d %b %Y %H:%M:%S %z',
+        '%a, %d %b %Y %H:%M:%S %Z',
+        '%Y-%m-%dT%H:%M:%S%z',
+        '%Y-%m-%dT%H:%M:%S.%f%z',
+        '%Y-%m-%d %H:%M:%S',
+        '%d.%m.%Y %H:%M'
+    ]
+
+    def __init__(self):
+        self._source_formats = {}
+        self._lock = threading.Lock()
+
+    def normalize(self, entry: Dict, source: str = None) -> datetime:
+        """Дата публикации записи ленты"""
+        for key in ('published_parsed', 'updated_parsed'):
+            parsed = entry.get(key)
+            if parsed:
+                try:
+                    return from_struct_time(parsed)
+                except (TypeError, ValueError):
+                    pass
+
+        return self.parse(entry.get('published') or entry.get('updated'), source)
+
+    def parse(self, date_str: Optional[str], source: str = None) -> datetime:
+        """Разбор строки даты; UNKNOWN_DATE, если формат не распознан"""
+        if not date_str:
+            return UNKNOWN_DATE
+
+        date_str = date_str.strip()
+        known = self._source_formats.get(source)
+        if known:
+            parsed = self._try_format(date_str, known)
+            if parsed:
+                return parsed
+
+        for fmt in self.FORMATS:
+            if fmt == known:
+                continue
+            parsed = self._try_format(date_str, fmt)
+            if parsed:
+                if source:
+                    with self._lock:
+                        self._source_formats[source] = fmt
+                return parsed
+
+        # Нестандартные варианты RFC 822 и ISO 8601
+        try:
+            return to_utc(parsedate_to_datetime(date_str))
+        except (TypeError, ValueError, IndexError):
+            pass
+        try:
+            return to_utc(datetime.fromisoformat(date_str.replace('Z', '+00:00')))
+        except ValueError:
+            return UNKNOWN_DATE
+
+    def stats(self) -> Dict:
+        """Запомненные форматы: число источников и формат каждого"""
+        with self._lock:
+            formats = dict(self._source_formats)
+        return {
+            'sources': len(formats),
+            'formats': formats
+        }
+
+    @staticmethod
+    def _try_format(date_str: str, fmt: str) -> Optional[datetime]:
+        """Разбор по одному формату"""
+        try:
+            return to_utc(datetime.strptime(date_str, fmt))
+        except ValueError:
+            return None
+
+_default_normalizer = DateNormalizer()
+
+def normalize_entry_date(entry: Dict, source: str = None) -> datetime:
+    """Дата записи ленты через общий нормализатор"""
+    return _default_normalizer.normalize(entry, source)
+
+def parse_date(date_str: Optional[str], source: str = None) -> datetime:
+    """Разбор строки даты через общий нормализатор"""
+    return _default_normalizer.parse(date_str, source)
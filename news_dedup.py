@@ -0,0 +1,123 @@
+import hashlib
+import random
+import re
+from typing import Dict, List, Tuple
+from text_search import stem
+from news_dates import UNKNOWN_DATE
+from config import DEDUP_NUM_PERM, DEDUP_BANDS, DEDUP_THRESHOLD
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+# Приоритет типов источников при выборе представителя кластера: прямые ленты
+# и локальная база выше агрегаторов (тип проставляет NewsSearcher)
+_TYPE_PRIORITY = {'rss': 2, 'local': 2, 'google': 1, 'yandex': 1}
+
+class NewsDeduplicator:
+    """Кластеризация почти одинаковых новостей.
+
+    Для каждой статьи строится MinHash сигнатура по шинглам (основы слов
+    и пары соседних основ) заголовка и описания. LSH по полосам сигнатуры
+    дает пары-кандидаты без сравнения всех со всеми, кандидаты проверяются
+    по оценке сходства Жаккара. Из каждого кластера остается одна статья -
+    самая информативная.
+    """
+
+    def __init__(self, num_perm: int = DEDUP_NUM_PERM, bands: int = DEDUP_BANDS,
+                 threshold: float = DEDUP_THRESHOLD, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+
+        # Перестановки хэшей моделируем XOR со случайными масками: это дешевле
+        # модульной арифметики, а min считается в C через map
+        rng = random.Random(seed)
+        self._masks = [rng.getrandbits(64) for _ in range(num_perm)]
+
+    def shingles(self, article: Dict) -> set:
+        """Шинглы статьи: основы слов и биграммы основ"""
+        text = f"{article.get('title', '')} {article.get('summary', '')}".lower()
+        stems = [stem(word) for word in _WORD_RE.findall(text) if len(word) > 2]
+        shingles = set(stems)
+        shingles.update(f"{a} {b}" for a, b in zip(stems, stems[1:]))
+        if not shingles and text.strip():
+            # Только короткие слова - сравниваем текст целиком
+            shingles.add(text.strip())
+        return shingles
+
+    def signature(self, shingles: set) -> Tuple[int, ...]:
+        """MinHash сигнатура множества шинглов"""
+        if not shingles:
+            return ()
+
+        hashes = [
+            int.from_bytes(hashlib.blake2b(s.encode('utf-8'), digest_size=8).digest(), 'little')
+            for s in shingles
+        ]
+        return tuple(min(map(mask.__xor__, hashes)) for mask in self._masks)
+
+    def similarity(self, first: Tuple[int, ...], second: Tuple[int, ...]) -> float:
+        """Оценка сходства Жаккара по сигнатурам"""
+        if not first or not second:
+            return 0.0
+        return sum(1 for x, y in zip(first, second) if x == y) / self.num_perm
+
+    def cluster(self, articles: List[Dict]) -> List[List[int]]:
+        """Группы индексов статей, описывающих одну новость"""
+        signatures = [self.signature(self.shingles(article)) for article in articles]
+        parent = list(range(len(articles)))
+
+        def find(i: int) -> int:
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        buckets = {}
+        for index, signature in enumerate(signatures):
+            if not signature:
+                continue
+            for band in range(self.bands):
+                key = (band, signature[band * self.rows:(band + 1) * self.rows])
+                for other in buckets.setdefault(key, []):
+                    if find(other) != find(index) and \
+                            self.similarity(signature, signatures[other]) >= self.threshold:
+                        parent[find(index)] = find(other)
+                buckets[key].append(index)
+
+        clusters = {}
+        for index in range(len(articles)):
+            clusters.setdefault(find(index), []).append(index)
+        return list(clusters.values())
+
+    def deduplicate(self, articles: List[Dict]) -> List[Dict]:
+        """Один представитель на кластер, в порядке первого появления"""
+        if len(articles) < 2:
+            return list(articles)
+
+        representatives = []
+        for indexes in sorted(self.cluster(articles), key=min):
+            best = max(indexes, key=lambda i: self._score(articles[i]))
+            article = articles[best]
+            if len(indexes) > 1:
+                article = dict(article)
+                article['cluster_size'] = len(indexes)
+            representatives.append(article)
+        return representatives
+
+    @staticmethod
+    def _score(article: Dict) -> Tuple:
+        """Насколько статья полезна как представитель кластера.
+
+        По порядку: прямой источник важнее агрегатора, затем наличие ссылки,
+        длина описания (дает модели больше контекста), свежесть.
+        """
+        return (
+            _TYPE_PRIORITY.get(article.get('type'), 0),
+            bool(article.get('link')),
+            min(len(article.get('summary') or ''), 500),
+            article.get('published') or UNKNOWN_DATE
+        )
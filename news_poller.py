@@ -0,0 +1,105 @@
+import asyncio
+import logging
+import random
+import time
+from typing import List
+from news_searcher import NewsSearcher
+from config import (
+    RSS_SOURCES, NEWS_POLL_INTERVAL, NEWS_POLL_JITTER, NEWS_POLL_MAX_BACKOFF,
+    ARTICLES_RETENTION_DAYS, FEED_CACHE_MAX_ENTRIES
+)
+
+logger = logging.getLogger(__name__)
+
+class NewsPoller:
+    """Фоновый опрос RSS лент с сохранением статей в базу данных.
+
+    Поиск по теме после этого идет по локальной таблице articles, а сеть
+    нужна только как запасной вариант. Период опроса слегка случайный,
+    а ленты с ошибками опрашиваются реже (экспоненциальная пауза).
+    """
+
+    def __init__(self, searcher: NewsSearcher, db, sources: List[str] = None,
+                 interval: float = NEWS_POLL_INTERVAL, jitter: float = NEWS_POLL_JITTER):
+        self.searcher = searcher
+        self.db = db
+        self.sources = sources or RSS_SOURCES
+        self.interval = interval
+        self.jitter = jitter
+
+        self._task = None
+        self._failures = {}
+        self._next_attempt = {}
+
+    def start(self):
+        """Запуск фоновой задачи"""
+        if self._task and not self._task.done():
+            return
+        self._task = asyncio.ensure_future(self._run())
+        logger.info(f"News poller started for {len(self.sources)} feeds")
+
+    async def stop(self):
+        """Остановка фоновой задачи"""
+        if not self._task:
+            return
+
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        logger.info("News poller stopped")
+
+    async def _run(self):
+        """Основной цикл опроса"""
+        async with self.searcher:
+            while True:
+                try:
+                    await self.poll_once()
+                    removed = await self.db.prune_articles(ARTICLES_RETENTION_DAYS)
+                    if removed:
+                        logger.info(f"Pruned {removed} old articles")
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"News polling cycle failed: {e}")
+
+                await asyncio.sleep(self._jittered(self.interval))
+
+    async def poll_once(self) -> int:
+        """Один проход по всем лентам, у которых истекла пауза; возвращает число новых статей"""
+        now = time.monotonic()
+        due = [url for url in self.sources if self._next_attempt.get(url, 0) <= now]
+        if not due:
+            return 0
+
+        results = await asyncio.gather(*(self._poll_feed(url) for url in due))
+        stored = sum(results)
+        logger.info(f"News poll: {len(due)} feeds, {stored} new or updated articles")
+        return stored
+
+    async def _poll_feed(self, url: str) -> int:
+        """Загрузка одной ленты с учетом паузы после ошибок"""
+        try:
+            articles = await asyncio.wait_for(
+                self.searcher.fetch_feed(url, FEED_CACHE_MAX_ENTRIES),
+                timeout=self.searcher.feed_timeout
+            )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            failures = self._failures.get(url, 0) + 1
+            self._failures[url] = failures
+            backoff = min(NEWS_POLL_MAX_BACKOFF, self.interval * 2 ** (failures - 1))
+            self._next_attempt[url] = time.monotonic() + self._jittered(backoff)
+            logger.warning(f"Polling {url} failed ({failures} in a row), next try in {backoff:.0f}s: {e}")
+            return 0
+
+        self._failures.pop(url, None)
+        self._next_attempt.pop(url, None)
+        return await self.db.add_articles(url, articles)
+
+    def _jittered(self, delay: float) -> float:
+        """Случайное отклонение паузы, чтобы запросы не шли синхронно"""
+        return delay * (1 + random.uniform(-self.jitter, self.jitter))
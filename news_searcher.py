@@ -1,35 +1,54 @@
 import asyncio
-import aiohttp
-import feedparser
 import logging
-import requests
-from datetime import datetime, timedelta
-from typing import List, Dict, Optional
-from bs4 import BeautifulSoup
+from typing import List, Dict, Optional, Tuple
 # from newspaper import Article  # Временно отключено из-за проблем с lxml.html.clean
-from config import RSS_SOURCES, MAX_NEWS_ARTICLES, NEWS_SEARCH_TIMEOUT, ENABLE_NEWS_SEARCH
+from config import (
+    RSS_SOURCES, MAX_NEWS_ARTICLES, NEWS_SEARCH_TIMEOUT, ENABLE_NEWS_SEARCH,
+    RSS_FEED_TIMEOUT, NEWS_SEARCH_DEADLINE, NEWS_PROVIDER_DEADLINE, NEWS_PROVIDERS,
+    FEED_CACHE_MAX_ENTRIES, NEWS_LOCAL_MIN_RESULTS, NEWS_LOCAL_MAX_AGE_HOURS
+)
+from feed_cache import FeedCache, get_default_feed_cache
+from feed_parser import FeedParserPool, get_default_feed_parser
+from http_client import HttpClient
+from text_search import topic_terms, matches_topic
+from news_dates import UNKNOWN_DATE, sort_by_date
+from news_dedup import NewsDeduplicator
+from single_flight import SingleFlight
 
 logger = logging.getLogger(__name__)
 
 class NewsSearcher:
-    def __init__(self):
-        self.session = None
+    def __init__(self, feed_cache: FeedCache = None, db=None, http: HttpClient = None,
+                 feed_parser: FeedParserPool = None):
+        # Общий HTTP клиент приложения; без него поиск работает со своим и закрывает его сам
+        self.http = http or HttpClient(timeout=NEWS_SEARCH_TIMEOUT)
+        self._owns_http = http is None
+        self.feed_cache = feed_cache or get_default_feed_cache()
+        self.feed_parser = feed_parser or get_default_feed_parser()
+        self.db = db  # AsyncDatabase с локальным хранилищем статей (наполняется NewsPoller)
         self.rss_sources = RSS_SOURCES
         self.max_articles = MAX_NEWS_ARTICLES
         self.timeout = NEWS_SEARCH_TIMEOUT
+        self.feed_timeout = RSS_FEED_TIMEOUT
+        self.search_deadline = NEWS_SEARCH_DEADLINE
+        self.provider_deadline = NEWS_PROVIDER_DEADLINE
+        self.providers = {name: dict(settings) for name, settings in NEWS_PROVIDERS.items()}
+        self.deduplicator = NewsDeduplicator()
+        self._inflight = SingleFlight()  # Одинаковые одновременные поиски выполняются один раз
         self.enabled = ENABLE_NEWS_SEARCH
     
     async def __aenter__(self):
         """Async context manager entry"""
-        self.session = aiohttp.ClientSession(
-            timeout=aiohttp.ClientTimeout(total=self.timeout)
-        )
         return self
     
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         """Async context manager exit"""
-        if self.session:
-            await self.session.close()
+        await self.close()
+
+    async def close(self):
+        """Закрытие собственного HTTP клиента (общий закрывает приложение)"""
+        if self._owns_http:
+            await self.http.close()
     
     async def search_news_by_topic(self, topic: str, max_results: int = None) -> List[Dict]:
         """Поиск новостей по теме"""
@@ -38,31 +57,25 @@ class NewsSearcher:
             return []
         
         max_results = max_results or self.max_articles
+        key = ('search_news', ' '.join(topic.lower().split()), max_results)
+        articles = await self._inflight.do(key, lambda: self._search_news_by_topic(topic, max_results))
+        return list(articles)
+
+    async def _search_news_by_topic(self, topic: str, max_results: int) -> List[Dict]:
+        """Поиск по локальному хранилищу и источникам"""
         logger.info(f"Searching news for topic: {topic}")
         
         try:
-            # Комбинируем результаты из разных источников
-            all_articles = []
-            
-            # 1. Поиск в RSS лентах
-            rss_articles = await self._search_rss_feeds(topic, max_results // 2)
-            all_articles.extend(rss_articles)
-            
-            # 2. Поиск через Google News (если доступен)
-            google_articles = await self._search_google_news(topic, max_results // 2)
-            all_articles.extend(google_articles)
-            
-            # 3. Поиск в Яндекс.Новостях
-            yandex_articles = await self._search_yandex_news(topic, max_results // 2)
-            all_articles.extend(yandex_articles)
+            # Сначала ищем в локальном хранилище, которое наполняет фоновый опрос лент
+            all_articles = await self.search_local(topic, max_results)
+
+            if len(all_articles) < min(max_results, NEWS_LOCAL_MIN_RESULTS):
+                # Локально найдено мало - опрашиваем все включенные источники параллельно
+                all_articles.extend(await self._search_providers(topic, max_results))
             
-            # Удаляем дубликаты и сортируем по дате
+            # Склеиваем пересказы одной новости из разных источников и сортируем по дате
             unique_articles = self._remove_duplicates(all_articles)
-            sorted_articles = sorted(
-                unique_articles, 
-                key=lambda x: x.get('published', datetime.min), 
-                reverse=True
-            )
+            sorted_articles = sort_by_date(unique_articles)
             
             return sorted_articles[:max_results]
             
@@ -70,6 +83,55 @@ class NewsSearcher:
             logger.error(f"Error searching news: {e}")
             return []
     
+    async def search_local(self, topic: str, limit: int = None) -> List[Dict]:
+        """Поиск по локальному полнотекстовому индексу статей (ранжирование BM25)"""
+        if not self.db:
+            return []
+
+        try:
+            return await self.db.search_articles(topic, limit or self.max_articles, NEWS_LOCAL_MAX_AGE_HOURS)
+        except Exception as e:
+            logger.warning(f"Local article search failed: {e}")
+            return []
+
+    async def _search_providers(self, topic: str, max_results: int) -> List[Dict]:
+        """Параллельный поиск по всем включенным провайдерам с общим дедлайном"""
+        search_functions = {
+            'rss': self._search_rss_feeds,
+            'google': self._search_google_news,
+            'yandex': self._search_yandex_news
+        }
+
+        tasks = {}
+        for name, settings in self.providers.items():
+            search = search_functions.get(name)
+            if not search or not settings.get('enabled', True):
+                continue
+
+            # Вес провайдера - доля max_results, которую он может занять (округление вниз)
+            limit = max(1, int(max_results * settings.get('weight', 1.0)))
+            tasks[name] = asyncio.ensure_future(search(topic, limit))
+
+        if not tasks:
+            logger.warning("All news providers are disabled")
+            return []
+
+        done, pending = await asyncio.wait(tasks.values(), timeout=self.provider_deadline)
+        for task in pending:
+            task.cancel()
+
+        # Результаты собираем в порядке провайдеров из конфигурации
+        all_articles = []
+        for name, task in tasks.items():
+            if task not in done:
+                logger.warning(f"News provider '{name}' missed the {self.provider_deadline}s deadline")
+            elif task.exception() is not None:
+                logger.warning(f"News provider '{name}' failed: {task.exception()}")
+            else:
+                all_articles.extend(task.result())
+
+        return all_articles
+
     async def get_latest_news(self, max_results: int = None) -> List[Dict]:
         """Получение последних новостей"""
         max_results = max_results or self.max_articles
@@ -78,21 +140,13 @@ class NewsSearcher:
         try:
             all_articles = []
             
-            # Получаем новости из RSS лент
-            for source in self.rss_sources:
-                try:
-                    articles = await self._fetch_rss_feed(source, max_results // len(self.rss_sources))
-                    all_articles.extend(articles)
-                except Exception as e:
-                    logger.warning(f"Error fetching from {source}: {e}")
-                    continue
+            # Получаем новости из всех RSS лент параллельно
+            per_source = max(1, max_results // max(1, len(self.rss_sources)))
+            for articles in await self._fetch_feeds(self.rss_sources, per_source):
+                all_articles.extend(articles)
             
-            # Сортируем по дате и возвращаем топ
-            sorted_articles = sorted(
-                all_articles,
-                key=lambda x: x.get('published', datetime.min),
-                reverse=True
-            )
+            # Убираем дубликаты, сортируем по дате и возвращаем топ
+            sorted_articles = sort_by_date(self._remove_duplicates(all_articles))
             
             return sorted_articles[:max_results]
             
@@ -103,70 +157,109 @@ class NewsSearcher:
     async def _search_rss_feeds(self, topic: str, max_results: int) -> List[Dict]:
         """Поиск в RSS лентах"""
         articles = []
-        topic_lower = topic.lower()
+        terms = topic_terms(topic)
         
-        for source in self.rss_sources:
-            try:
-                feed_articles = await self._fetch_rss_feed(source)
-                
-                # Фильтруем по теме
-                for article in feed_articles:
-                    title = article.get('title', '').lower()
-                    summary = article.get('summary', '').lower()
+        # Ленты загружаются параллельно, фильтруем в порядке источников
+        for feed_articles in await self._fetch_feeds(self.rss_sources):
+            for article in feed_articles:
+                if self._matches_topic(article, topic, terms):
+                    articles.append(article)
                     
-                    if topic_lower in title or topic_lower in summary:
-                        articles.append(article)
-                        
-                        if len(articles) >= max_results:
-                            break
-                
-                if len(articles) >= max_results:
-                    break
-                    
-            except Exception as e:
-                logger.warning(f"Error searching RSS feed {source}: {e}")
-                continue
+                    if len(articles) >= max_results:
+                        break
+            
+            if len(articles) >= max_results:
+                break
         
         return articles
+
+    async def _fetch_feeds(self, sources: List[str], max_articles: int = 20) -> List[List[Dict]]:
+        """Параллельная загрузка RSS лент с таймаутом на источник и общим дедлайном"""
+        if not sources:
+            return []
+
+        async def fetch(source: str) -> List[Dict]:
+            try:
+                return await asyncio.wait_for(
+                    self._fetch_rss_feed(source, max_articles),
+                    timeout=self.feed_timeout
+                )
+            except asyncio.TimeoutError:
+                logger.warning(f"RSS feed {source} timed out after {self.feed_timeout}s")
+                return []
+
+        tasks = [asyncio.ensure_future(fetch(source)) for source in sources]
+        done, pending = await asyncio.wait(tasks, timeout=self.search_deadline)
+
+        # Что не успело к дедлайну - отменяем, берем то, что уже загружено
+        for task in pending:
+            task.cancel()
+        if pending:
+            logger.warning(f"{len(pending)} of {len(sources)} RSS feeds missed the {self.search_deadline}s deadline")
+
+        results = []
+        for task in tasks:
+            if task in done and task.exception() is None:
+                results.append(task.result())
+            else:
+                results.append([])
+        return results
     
     async def _fetch_rss_feed(self, url: str, max_articles: int = 20) -> List[Dict]:
-        """Получение статей из RSS ленты"""
+        """Получение статей из RSS ленты (через общий кэш)"""
         try:
-            if self.session:
-                async with self.session.get(url) as response:
-                    content = await response.text()
-            else:
-                # Fallback для синхронного запроса
-                response = requests.get(url, timeout=self.timeout)
-                content = response.text
-            
-            feed = feedparser.parse(content)
-            articles = []
-            
-            for entry in feed.entries[:max_articles]:
-                article = {
-                    'title': entry.get('title', 'No title'),
-                    'summary': entry.get('summary', entry.get('description', '')),
-                    'link': entry.get('link', ''),
-                    'published': self._parse_date(entry.get('published')),
-                    'source': feed.feed.get('title', url),
-                    'type': 'rss'
-                }
-                articles.append(article)
-            
-            return articles
-            
+            return await self.fetch_feed(url, max_articles)
         except Exception as e:
             logger.error(f"Error fetching RSS feed {url}: {e}")
             return []
+
+    async def fetch_feed(self, url: str, max_articles: int = 20) -> List[Dict]:
+        """Загрузка и разбор RSS ленты; в отличие от _fetch_rss_feed пробрасывает ошибки"""
+        cached, fresh = self.feed_cache.lookup(url)
+        if fresh:
+            return cached['articles'][:max_articles]
+
+        # Устаревшую запись проверяем условным запросом
+        headers = self.feed_cache.conditional_headers(cached)
+        status, content, etag, last_modified = await self._download(url, headers)
+
+        if status == 304:
+            entry = self.feed_cache.mark_revalidated(url) if headers else None
+            if entry is not None:
+                return entry['articles'][:max_articles]
+
+            # 304 без сохраненной ленты (запись вытеснена или заголовков не было) - запрашиваем заново
+            status, content, etag, last_modified = await self._download(url, {})
+            if status == 304:
+                raise RuntimeError(f"Unexpected 304 Not Modified for unconditional request to {url}")
+
+        # Разбор и очистка HTML - в пуле, чтобы не блокировать обработку сообщений
+        articles = await self.feed_parser.parse(content, url, max(max_articles, FEED_CACHE_MAX_ENTRIES))
+
+        if status == 200:
+            self.feed_cache.put(url, articles, etag, last_modified)
+
+        return articles[:max_articles]
     
+    async def _download(self, url: str, headers: Dict[str, str]) -> Tuple[int, Optional[bytes], Optional[str], Optional[str]]:
+        """GET ленты: (статус, тело или None при 304, ETag, Last-Modified)"""
+        async with self.http.session.get(url, headers=headers) as response:
+            response.raise_for_status()
+            content = await response.read() if response.status != 304 else None
+            return (
+                response.status, content,
+                response.headers.get('ETag'), response.headers.get('Last-Modified')
+            )
+
     async def _search_google_news(self, topic: str, max_results: int) -> List[Dict]:
         """Поиск в Google News (через RSS)"""
         try:
             # Google News RSS URL
             google_news_url = f"https://news.google.com/rss/search?q={topic}&hl=ru&gl=RU&ceid=RU:ru"
             
-            return await self._fetch_rss_feed(google_news_url, max_results)
+            articles = await self._fetch_rss_feed(google_news_url, max_results)
+            # Помечаем агрегатор, чтобы при дедупликации предпочесть прямой источник
+            return [dict(article, type='google') for article in articles]
             
         except Exception as e:
             logger.error(f"Error searching Google News: {e}")
@@ -180,15 +273,12 @@ class NewsSearcher:
             articles = await self._fetch_rss_feed(yandex_url, max_results * 2)
             
             # Фильтруем по теме
-            topic_lower = topic.lower()
+            terms = topic_terms(topic)
             filtered_articles = []
             
             for article in articles:
-                title = article.get('title', '').lower()
-                summary = article.get('summary', '').lower()
-                
-                if topic_lower in title or topic_lower in summary:
-                    filtered_articles.append(article)
+                if self._matches_topic(article, topic, terms):
+                    filtered_articles.append(dict(article, type='yandex'))
                     
                     if len(filtered_articles) >= max_results:
                         break
@@ -199,45 +289,17 @@ class NewsSearcher:
             logger.error(f"Error searching Yandex News: {e}")
             return []
     
-    def _parse_date(self, date_str: str) -> datetime:
-        """Парсинг даты из различных форматов"""
-        if not date_str:
-            return datetime.min
-        
-        try:
-            # Пробуем различные форматы
-            formats = [
-                '%a, %d %b %Y %H:%M:%S %z',
-                '%a, %d %b %Y %H:%M:%S %Z',
-                '%Y-%m-%dT%H:%M:%S%z',
-                '%Y-%m-%d %H:%M:%S',
-                '%d.%m.%Y %H:%M'
-            ]
-            
-            for fmt in formats:
-                try:
-                    return datetime.strptime(date_str, fmt)
-                except ValueError:
-                    continue
-            
-            # Если ничего не подошло, возвращаем текущее время
-            return datetime.now()
-            
-        except Exception:
-            return datetime.min
-    
+    def _matches_topic(self, article: Dict, topic: str, terms: List[str]) -> bool:
+        """Соответствие статьи теме с учетом словоформ"""
+        text = f"{article.get('title', '')}\n{article.get('summary', '')}"
+        if terms:
+            return matches_topic(text, terms)
+        return topic.lower() in text.lower()
+
     def _remove_duplicates(self, articles: List[Dict]) -> List[Dict]:
-        """Удаление дубликатов статей"""
-        seen_titles = set()
-        unique_articles = []
-        
-        for article in articles:
-            title = article.get('title', '').strip().lower()
-            if title and title not in seen_titles:
-                seen_titles.add(title)
-                unique_articles.append(article)
-        
-        return unique_articles
+        """Удаление дубликатов статей: один представитель на кластер похожих"""
+        articles = [article for article in articles if article.get('title', '').strip()]
+        return self.deduplicator.deduplicate(articles)
     
     async def get_article_content(self, url: str) -> Optional[str]:
         """Получение полного содержимого статьи (временно отключено)"""
@@ -273,7 +335,7 @@ class NewsSearcher:
             summary += f"**{i}. {title}**\n"
             summary += f"📅 {source}"
             
-            if published and published != datetime.min:
+            if published and published != UNKNOWN_DATE:
                 summary += f" • {published.strftime('%d.%m.%Y %H:%M')}"
             
             if link:
@@ -1,20 +1,23 @@
 import logging
-from typing import List, Dict, Optional
-from database import Database
+from typing import Awaitable, Callable, List, Dict, Optional
+from async_database import AsyncDatabase
 from gemini_client import GeminiClient
+from services import get_default_services
 
 logger = logging.getLogger(__name__)
 
 class PostGenerator:
-    def __init__(self):
-        self.db = Database()
-        self.gemini = GeminiClient()
+    def __init__(self, db: AsyncDatabase = None, gemini: GeminiClient = None):
+        # Без явных зависимостей берем общие, а не создаем еще одну базу и клиент
+        self.db = db or get_default_services().db
+        self.gemini = gemini or get_default_services().gemini
     
-    async def generate_post_by_topic(self, channel_id: int, topic: str, include_news: bool = False) -> Dict:
+    async def generate_post_by_topic(self, channel_id: int, topic: str, include_news: bool = False,
+                                     fresh: bool = False) -> Dict:
         """Генерация поста по заданной теме"""
         try:
             # Получаем анализ стиля канала
-            style_info = self.db.get_style_analysis(channel_id)
+            style_info = await self.db.get_style_analysis(channel_id)
 
             if not style_info or not style_info['style_analysis']:
                 return {
@@ -27,7 +30,8 @@ class PostGenerator:
                 style_analysis=style_info['style_analysis'],
                 topic=topic,
                 post_type="topic",
-                include_news=include_news
+                include_news=include_news,
+                fresh=fresh
             )
 
             if not generated_post:
@@ -51,10 +55,53 @@ class PostGenerator:
                 'error': str(e)
             }
     
-    async def generate_random_post(self, channel_id: int) -> Dict:
+    async def stream_post(self, channel_id: int, post_type: str, topic: str = None, fresh: bool = False,
+                          on_update: Callable[[str], Awaitable[None]] = None) -> Dict:
+        """Потоковая генерация поста: on_update получает накопленный текст по мере генерации"""
+        try:
+            style_info = await self.db.get_style_analysis(channel_id)
+
+            if not style_info or not style_info['style_analysis']:
+                return {
+                    'success': False,
+                    'error': 'Анализ стиля канала не найден. Сначала проанализируйте канал.'
+                }
+
+            generated_post = ''
+            async for chunk in self.gemini.stream_post(
+                style_analysis=style_info['style_analysis'],
+                topic=topic,
+                post_type=post_type,
+                fresh=fresh
+            ):
+                generated_post += chunk
+                if on_update:
+                    await on_update(generated_post)
+
+            if not generated_post.strip():
+                return {
+                    'success': False,
+                    'error': 'Ошибка при генерации поста'
+                }
+
+            return {
+                'success': True,
+                'post': generated_post,
+                'topic': topic if topic else 'Случайная тема',
+                'channel_id': channel_id
+            }
+
+        except Exception as e:
+            logger.error(f"Error streaming post: {e}")
+            return {
+                'success': False,
+                'error': str(e)
+            }
+
+    async def generate_random_post(self, channel_id: int, fresh: bool = False) -> Dict:
         """Генерация случайного поста"""
         try:
-            style_info = self.db.get_style_analysis(channel_id)
+            style_info = await self.db.get_style_analysis(channel_id)
 
             if not style_info or not style_info['style_analysis']:
                 return {
@@ -64,7 +111,8 @@ class PostGenerator:
 
             generated_post = await self.gemini.generate_post(
                 style_analysis=style_info['style_analysis'],
-                post_type="random"
+                post_type="random",
+                fresh=fresh
             )
 
             if not generated_post:
@@ -87,10 +135,10 @@ class PostGenerator:
                 'error': str(e)
             }
     
-    def generate_free_topic_post(self, channel_id: int, user_request: str) -> Dict:
+    async def generate_free_topic_post(self, channel_id: int, user_request: str, fresh: bool = False) -> Dict:
         """Генерация поста по свободной теме"""
         try:
-            style_info = self.db.get_style_analysis(channel_id)
+            style_info = await self.db.get_style_analysis(channel_id)
             
             if not style_info or not style_info['style_analysis']:
                 return {
@@ -98,10 +146,11 @@ class PostGenerator:
                     'error': 'Анализ стиля канала не найден'
                 }
             
-            generated_post = self.gemini.generate_post(
+            generated_post = await self.gemini.generate_post(
                 style_analysis=style_info['style_analysis'],
                 topic=user_request,
-                post_type="free"
+                post_type="free",
+                fresh=fresh
             )
             
             if not generated_post:
@@ -124,10 +173,10 @@ class PostGenerator:
                 'error': str(e)
             }
     
-    def generate_multiple_variants(self, channel_id: int, topic: str, count: int = 3) -> Dict:
+    async def generate_multiple_variants(self, channel_id: int, topic: str, count: int = 3) -> Dict:
         """Генерация нескольких вариантов поста"""
         try:
-            style_info = self.db.get_style_analysis(channel_id)
+            style_info = await self.db.get_style_analysis(channel_id)
             
             if not style_info or not style_info['style_analysis']:
                 return {
@@ -135,7 +184,7 @@ class PostGenerator:
                     'error': 'Анализ стиля канала не найден'
                 }
             
-            variants = self.gemini.generate_multiple_variants(
+            variants = await self.gemini.generate_multiple_variants(
                 style_analysis=style_info['style_analysis'],
                 topic=topic,
                 count=count
@@ -162,10 +211,10 @@ class PostGenerator:
                 'error': str(e)
             }
     
-    def improve_post(self, channel_id: int, post_content: str, feedback: str) -> Dict:
+    async def improve_post(self, channel_id: int, post_content: str, feedback: str) -> Dict:
         """Улучшение поста на основе обратной связи"""
         try:
-            style_info = self.db.get_style_analysis(channel_id)
+            style_info = await self.db.get_style_analysis(channel_id)
             
             if not style_info or not style_info['style_analysis']:
                 return {
@@ -173,7 +222,7 @@ class PostGenerator:
                     'error': 'Анализ стиля канала не найден'
                 }
             
-            improved_post = self.gemini.improve_post(
+            improved_post = await self.gemini.improve_post(
                 post_content=post_content,
                 style_analysis=style_info['style_analysis'],
                 feedback=feedback
@@ -199,10 +248,10 @@ class PostGenerator:
                 'error': str(e)
             }
     
-    def get_channel_style_summary(self, channel_id: int) -> Dict:
+    async def get_channel_style_summary(self, channel_id: int) -> Dict:
         """Получение краткого описания стиля канала"""
         try:
-            style_info = self.db.get_style_analysis(channel_id)
+            style_info = await self.db.get_style_analysis(channel_id)
             
             if not style_info:
                 return {
@@ -211,7 +260,7 @@ class PostGenerator:
                 }
             
             # Получаем информацию о канале
-            channels = self.db.get_user_channels(0)  # Нужно исправить для конкретного пользователя
+            channels = await self.db.get_user_channels(0)  # Нужно исправить для конкретного пользователя
             channel_info = None
             
             for channel in channels:
@@ -234,10 +283,10 @@ class PostGenerator:
                 'error': str(e)
             }
 
-    async def generate_news_based_post(self, channel_id: int, topic: str) -> Dict:
+    async def generate_news_based_post(self, channel_id: int, topic: str, fresh: bool = False) -> Dict:
         """Генерация поста на основе актуальных новостей"""
         try:
-            style_info = self.db.get_style_analysis(channel_id)
+            style_info = await self.db.get_style_analysis(channel_id)
 
             if not style_info or not style_info['style_analysis']:
                 return {
@@ -247,7 +296,8 @@ class PostGenerator:
 
             generated_post = await self.gemini.generate_news_based_post(
                 style_analysis=style_info['style_analysis'],
-                topic=topic
+                topic=topic,
+                fresh=fresh
             )
 
             if not generated_post:
@@ -271,10 +321,10 @@ class PostGenerator:
                 'error': str(e)
             }
 
-    async def get_news_summary(self, topic: str, max_articles: int = 5) -> Dict:
+    async def get_news_summary(self, topic: str, max_articles: int = 5, fresh: bool = False) -> Dict:
         """Получение сводки новостей по теме"""
         try:
-            news_summary = await self.gemini.summarize_news(topic, max_articles)
+            news_summary = await self.gemini.summarize_news(topic, max_articles, fresh)
 
             if not news_summary:
                 return {
@@ -299,7 +349,7 @@ class PostGenerator:
     async def generate_multiple_variants_with_news(self, channel_id: int, topic: str, count: int = 3) -> Dict:
         """Генерация нескольких вариантов поста с использованием новостей"""
         try:
-            style_info = self.db.get_style_analysis(channel_id)
+            style_info = await self.db.get_style_analysis(channel_id)
 
             if not style_info or not style_info['style_analysis']:
                 return {
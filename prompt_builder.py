@@ -0,0 +1,132 @@
+import math
+import re
+from datetime import datetime
+from typing import Dict, List, Tuple
+from config import STYLE_PROMPT_TOKEN_BUDGET, STYLE_PROMPT_MAX_POST_TOKENS, STYLE_PROMPT_MAX_POSTS, CHARS_PER_TOKEN
+
+_LIST_RE = re.compile(r'^\s*(?:[-•*▪️✅]|\d+[.)])\s', re.MULTILINE)
+_LINK_RE = re.compile(r'https?://|t\.me/|@\w{4,}')
+_EMOJI_RE = re.compile('[\U0001F300-\U0001FAFF☀-➿]')
+
+POSTS_SEPARATOR = "\n\n---\n\n"
+
+def estimate_tokens(text: str) -> int:
+    """Быстрая оценка числа токенов по длине текста"""
+    if not text:
+        return 0
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Обрезка текста до бюджета токенов по границе слова"""
+    max_chars = int(max_tokens * CHARS_PER_TOKEN)
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    space = cut.rfind(' ')
+    if space > max_chars // 2:
+        cut = cut[:space]
+    return cut.rstrip() + '…'
+
+class StylePromptBuilder:
+    """Подбор постов для анализа стиля в пределах бюджета токенов.
+
+    Посты раскладываются по группам (длина × структура), из групп берется
+    по очереди, а внутри группы - вперемешку новые и старые, чтобы выборка
+    покрывала весь разброс стиля. Слишком длинные посты обрезаются, поэтому
+    размер промпта и время анализа почти не зависят от канала.
+    """
+
+    def __init__(self, token_budget: int = STYLE_PROMPT_TOKEN_BUDGET,
+                 max_post_tokens: int = STYLE_PROMPT_MAX_POST_TOKENS,
+                 max_posts: int = STYLE_PROMPT_MAX_POSTS):
+        self.token_budget = token_budget
+        self.max_post_tokens = max_post_tokens
+        self.max_posts = max_posts
+
+    def select(self, posts: List[Dict], token_budget: int = None) -> List[str]:
+        """Тексты выбранных постов (уже обрезанные), от новых к старым"""
+        budget = self.token_budget if token_budget is None else token_budget
+        separator_tokens = estimate_tokens(POSTS_SEPARATOR)
+
+        candidates = []
+        for position, post in enumerate(posts):
+            content = (post.get('content') or '').strip()
+            if not content:
+                continue
+            text = truncate_to_tokens(content, self.max_post_tokens)
+            candidates.append((position, post, text, estimate_tokens(text)))
+
+        selected = []
+        used = 0
+        for position, post, text, tokens in self._diverse_order(candidates):
+            if len(selected) >= self.max_posts:
+                break
+            if used + tokens + separator_tokens > budget:
+                # Не влез - пробуем следующие, они могут быть короче
+                continue
+            selected.append((position, post, text))
+            used += tokens + separator_tokens
+
+        # Порядок в промпте - как во входном списке (обычно от новых к старым)
+        selected.sort(key=lambda item: item[0])
+        return [text for _, _, text in selected]
+
+    def build_posts_block(self, posts: List[Dict], token_budget: int = None) -> Tuple[str, int]:
+        """Блок постов для промпта и число вошедших постов"""
+        texts = self.select(posts, token_budget)
+        return POSTS_SEPARATOR.join(texts), len(texts)
+
+    def _diverse_order(self, candidates: List[Tuple]) -> List[Tuple]:
+        """Очередность постов: по кругу из групп, в группе - чередуя новые и старые"""
+        if not candidates:
+            return []
+
+        lengths = sorted(tokens for *_, tokens in candidates)
+        short_limit = lengths[len(lengths) // 3]
+        long_limit = lengths[2 * len(lengths) // 3]
+
+        groups = {}
+        for candidate in candidates:
+            _, post, text, tokens = candidate
+            length_class = 0 if tokens <= short_limit else (2 if tokens > long_limit else 1)
+            groups.setdefault((length_class, self._structure(text)), []).append(candidate)
+
+        queues = []
+        for members in groups.values():
+            members.sort(key=lambda candidate: self._post_date(candidate[1]), reverse=True)
+            # Новые и старые вперемешку: 0, -1, 1, -2, ...
+            interleaved = []
+            left, right = 0, len(members) - 1
+            while left <= right:
+                interleaved.append(members[left])
+                if left != right:
+                    interleaved.append(members[right])
+                left += 1
+                right -= 1
+            queues.append(interleaved)
+
+        # Крупные группы первыми, чтобы типичный стиль попал в выборку наверняка
+        queues.sort(key=len, reverse=True)
+        ordered = []
+        for index in range(max(len(queue) for queue in queues)):
+            for queue in queues:
+                if index < len(queue):
+                    ordered.append(queue[index])
+        return ordered
+
+    @staticmethod
+    def _structure(text: str) -> Tuple[bool, bool, bool]:
+        """Признаки структуры поста: списки или абзацы, ссылки, эмодзи"""
+        return (
+            bool(_LIST_RE.search(text)) or text.count('\n') >= 3,
+            bool(_LINK_RE.search(text)),
+            bool(_EMOJI_RE.search(text))
+        )
+
+    @staticmethod
+    def _post_date(post: Dict) -> str:
+        """Дата поста для сортировки (datetime или строка из SQLite)"""
+        date = post.get('date')
+        if isinstance(date, datetime):
+            return date.isoformat(sep=' ')
+        return str(date or '')
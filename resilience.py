@@ -0,0 +1,289 @@
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+import aiohttp
+import requests
+from admission import AdmissionController, AdmissionRejected
+from config import (
+    GEMINI_RETRY_ATTEMPTS, GEMINI_RETRY_BASE_DELAY, GEMINI_RETRY_MAX_DELAY,
+    GEMINI_CALL_DEADLINE, GEMINI_ATTEMPT_TIMEOUT,
+    GEMINI_HEDGE_ENABLED, GEMINI_HEDGE_PERCENTILE, GEMINI_HEDGE_MIN_SAMPLES, GEMINI_HEDGE_MIN_DELAY,
+    GEMINI_HEDGE_BUDGET, GEMINI_HEDGE_BUDGET_WINDOW,
+    GEMINI_BREAKER_FAILURES, GEMINI_BREAKER_RESET_TIMEOUT
+)
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+# HTTP коды, после которых имеет смысл повторить запрос
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+RETRYABLE_EXCEPTIONS = (
+    asyncio.TimeoutError, ConnectionError,
+    aiohttp.ClientConnectionError,
+    requests.exceptions.ConnectionError, requests.exceptions.Timeout
+)
+
+def is_retryable(error: BaseException) -> bool:
+    """Временная ли ошибка: перегрузка, таймаут, обрыв соединения"""
+    code = getattr(error, 'code', None)
+    if isinstance(code, int):
+        return code in RETRYABLE_STATUS_CODES
+    return isinstance(error, RETRYABLE_EXCEPTIONS)
+
+class CircuitOpenError(AdmissionRejected):
+    """API сейчас недоступно - вызов отклонен без обращения к нему"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(
+            f"🛠 Сервис генерации временно недоступен. Попробуйте через {max(1, round(retry_after))} сек.",
+            'degraded'
+        )
+        self.retry_after = retry_after
+
+class CircuitBreaker:
+    """Предохранитель: после серии временных ошибок подряд вызовы сразу отклоняются.
+
+    Через reset_timeout пропускается один пробный вызов; если он успешен,
+    предохранитель снова замыкается.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = GEMINI_BREAKER_FAILURES,
+                 reset_timeout: float = GEMINI_BREAKER_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    def before_call(self) -> bool:
+        """Проверка перед вызовом; True - этот вызов пробный. CircuitOpenError, если вызывать нельзя"""
+        if self.state == self.CLOSED:
+            return False
+
+        elapsed = time.monotonic() - self._opened_at
+        if self.state == self.OPEN and elapsed >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+            logger.info("Gemini circuit breaker half-open, sending a probe request")
+
+        if self.state == self.HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+
+        raise CircuitOpenError(max(0.0, self.reset_timeout - elapsed))
+
+    def cancel_probe(self):
+        """Пробный вызов отменен, не дойдя до ответа"""
+        self._probe_in_flight = False
+
+    def record_success(self, probe: bool = False):
+        """Успешный вызов"""
+        if self.state != self.CLOSED:
+            logger.info("Gemini circuit breaker closed")
+        self.state = self.CLOSED
+        self._failures = 0
+        if probe:
+            self._probe_in_flight = False
+
+    def record_failure(self, probe: bool = False):
+        """Временная ошибка вызова"""
+        self._failures += 1
+        if probe:
+            self._probe_in_flight = False
+        if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                logger.warning(f"Gemini circuit breaker opened after {self._failures} failures")
+            self.state = self.OPEN
+            self._opened_at = time.monotonic()
+
+class LatencyTracker:
+    """Скользящее окно длительностей успешных вызовов"""
+
+    def __init__(self, window: int = 200):
+        self._samples = deque(maxlen=window)
+
+    def add(self, seconds: float):
+        self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, percent: float) -> Optional[float]:
+        """Перцентиль длительности или None, если замеров нет"""
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(len(ordered) * percent / 100))
+        return ordered[index]
+
+class ResilientCaller:
+    """Устойчивый вызов API.
+
+    Временные ошибки повторяются с экспоненциальной паузой и случайным
+    разбросом, постоянные (неверный запрос, ключ) сразу пробрасываются.
+    Весь вызов ограничен общим сроком. Если попытка идет дольше обычного
+    (перцентиль задержки для операции), параллельно запускается вторая, и
+    берется первый ответ. Дубли ограничены бюджетом (доля последних попыток)
+    и берут свой слот допуска, только если он свободен сразу, поэтому при
+    общем замедлении API нагрузка не удваивается. Предохранитель не дает
+    нагружать API, пока оно недоступно.
+    """
+
+    def __init__(self, attempts: int = GEMINI_RETRY_ATTEMPTS, base_delay: float = GEMINI_RETRY_BASE_DELAY,
+                 max_delay: float = GEMINI_RETRY_MAX_DELAY, deadline: float = GEMINI_CALL_DEADLINE,
+                 attempt_timeout: float = GEMINI_ATTEMPT_TIMEOUT, hedge: bool = GEMINI_HEDGE_ENABLED,
+                 hedge_percentile: float = GEMINI_HEDGE_PERCENTILE, breaker: CircuitBreaker = None,
+                 admission: AdmissionController = None, hedge_budget: float = GEMINI_HEDGE_BUDGET):
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.attempt_timeout = attempt_timeout
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.breaker = breaker or CircuitBreaker()
+        # Дубль занимает отдельный слот допуска, иначе он обходил бы общий лимит одновременных вызовов
+        self.admission = admission
+        self.hedge_budget = hedge_budget
+        self._latency: Dict[str, LatencyTracker] = {}
+        # Были ли дубли у последних попыток: их доля не больше hedge_budget
+        self._recent_attempts = deque(maxlen=GEMINI_HEDGE_BUDGET_WINDOW)
+        self._recent_hedges = 0
+
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    async def call(self, func: Callable[[], Awaitable[T]], operation: str = None, hedge: bool = True) -> T:
+        """Вызов func() с повторами; func должна создавать новый запрос при каждом вызове"""
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            probe = self.breaker.before_call()
+
+            remaining = self.deadline - (time.monotonic() - started)
+            timeout = min(self.attempt_timeout, remaining)
+            attempt_started = time.monotonic()
+            try:
+                result = await self._attempt(func, operation, timeout, hedge)
+            except asyncio.CancelledError:
+                # Пробный вызов освобождает место для следующей пробы; чужой - не трогает
+                if probe:
+                    self.breaker.cancel_probe()
+                raise
+            except Exception as e:
+                if not is_retryable(e):
+                    # Ошибка в самом запросе - API работает, повтор не поможет
+                    self.breaker.record_success(probe)
+                    raise
+                self.breaker.record_failure(probe)
+
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+                elapsed = time.monotonic() - started
+                if attempt >= self.attempts or elapsed + delay >= self.deadline:
+                    logger.error(f"Gemini call failed after {attempt} attempts ({elapsed:.1f}s): {e!r}")
+                    raise
+
+                self.retries += 1
+                logger.warning(f"Gemini call failed (attempt {attempt}), retrying in {delay:.1f}s: {e!r}")
+                await asyncio.sleep(delay)
+                continue
+
+            self.breaker.record_success(probe)
+            if operation:
+                self._tracker(operation).add(time.monotonic() - attempt_started)
+            return result
+
+    def stats(self) -> Dict:
+        """Счетчики повторов и дублирующих запросов"""
+        return {
+            'breaker': self.breaker.state,
+            'retries': self.retries,
+            'hedges': self.hedges,
+            'hedge_wins': self.hedge_wins
+        }
+
+    def _tracker(self, operation: str) -> LatencyTracker:
+        tracker = self._latency.get(operation)
+        if tracker is None:
+            tracker = self._latency[operation] = LatencyTracker()
+        return tracker
+
+    def _record_attempt(self, hedged: bool):
+        """Учет попытки в окне бюджета дублей"""
+        if len(self._recent_attempts) == self._recent_attempts.maxlen:
+            self._recent_hedges -= self._recent_attempts[0]
+        self._recent_attempts.append(hedged)
+        self._recent_hedges += hedged
+
+    def _hedge_allowed(self) -> bool:
+        """Дубль укладывается в бюджет и для него есть свободный слот без ожидания"""
+        window = max(len(self._recent_attempts), GEMINI_HEDGE_MIN_SAMPLES)
+        if self._recent_hedges + 1 > self.hedge_budget * window:
+            return False
+        return self.admission is None or self.admission.try_acquire_nowait()
+
+    def _hedge_delay(self, operation: Optional[str]) -> Optional[float]:
+        """Через сколько секунд запускать дублирующий запрос (None - не запускать)"""
+        if not self.hedge or not operation or self.breaker.state != CircuitBreaker.CLOSED:
+            return None
+        tracker = self._latency.get(operation)
+        if tracker is None or len(tracker) < GEMINI_HEDGE_MIN_SAMPLES:
+            return None
+        return max(GEMINI_HEDGE_MIN_DELAY, tracker.percentile(self.hedge_percentile))
+
+    async def _attempt(self, func: Callable[[], Awaitable[T]], operation: Optional[str],
+                       timeout: float, hedge: bool) -> T:
+        """Одна попытка, при долгом ответе - с дублирующим запросом"""
+        hedge_delay = self._hedge_delay(operation) if hedge else None
+        if hedge_delay is None or hedge_delay >= timeout:
+            self._record_attempt(False)
+            return await asyncio.wait_for(func(), timeout=timeout)
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        primary = asyncio.ensure_future(func())
+        tasks = [primary]
+        hedged = False
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+            if not done and self._hedge_allowed():
+                hedged = True
+                self.hedges += 1
+                logger.info(f"Gemini {operation} slower than {hedge_delay:.1f}s, sending hedged request")
+                hedge_task = asyncio.ensure_future(func())
+                if self.admission is not None:
+                    hedge_task.add_done_callback(lambda _: self.admission.release())
+                tasks.append(hedge_task)
+
+            pending = set(tasks)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, timeout=max(0.0, deadline - loop.time()),
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    raise asyncio.TimeoutError()
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            # Все попытки завершились ошибкой
+            raise error
+        finally:
+            self._record_attempt(hedged)
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
@@ -0,0 +1,140 @@
+import logging
+import time
+from functools import cached_property
+from typing import Optional
+from admission import AdmissionController
+from async_database import AsyncDatabase
+from channel_post_buffer import ChannelPostBuffer
+from feed_cache import FeedCache
+from feed_parser import FeedParserPool
+from gemini_client import GeminiClient
+from generation_cache import GenerationCache
+from http_client import HttpClient
+from news_poller import NewsPoller
+from news_searcher import NewsSearcher
+from resilience import ResilientCaller
+from config import ENABLE_NEWS_POLLER, GEMINI_CACHE_PERSIST
+
+logger = logging.getLogger(__name__)
+
+class Services:
+    """Общие зависимости приложения.
+
+    Каждая тяжелая зависимость (база данных, клиент Gemini, пулы HTTP и
+    разбора лент, кэши, лимиты запросов) создается один раз при первом
+    обращении и передается всем, кому нужна. start() и close() запускают
+    и останавливают только то, что уже было создано.
+    """
+
+    def __init__(self):
+        self._started = False
+        self._closed = False
+
+    @cached_property
+    def db(self) -> AsyncDatabase:
+        return AsyncDatabase()
+
+    @cached_property
+    def feed_cache(self) -> FeedCache:
+        return FeedCache(db=self.db)
+
+    @cached_property
+    def http(self) -> HttpClient:
+        return HttpClient()  # Общий пул HTTP соединений для поиска новостей
+
+    @cached_property
+    def feed_parser(self) -> FeedParserPool:
+        return FeedParserPool()
+
+    @cached_property
+    def generation_cache(self) -> GenerationCache:
+        return GenerationCache(db=self.db if GEMINI_CACHE_PERSIST else None)
+
+    @cached_property
+    def admission(self) -> AdmissionController:
+        return AdmissionController()  # Лимиты и очередь запросов к Gemini
+
+    @cached_property
+    def resilience(self) -> ResilientCaller:
+        return ResilientCaller(admission=self.admission)
+
+    @cached_property
+    def news_searcher(self) -> NewsSearcher:
+        return NewsSearcher(
+            feed_cache=self.feed_cache, db=self.db, http=self.http, feed_parser=self.feed_parser
+        )
+
+    @cached_property
+    def gemini(self) -> GeminiClient:
+        return GeminiClient(
+            news_searcher=self.news_searcher,
+            cache=self.generation_cache,
+            admission=self.admission,
+            resilience=self.resilience
+        )
+
+    @cached_property
+    def post_buffer(self) -> ChannelPostBuffer:
+        return ChannelPostBuffer(self.db)  # Посты из каналов, где бот администратор
+
+    @cached_property
+    def news_poller(self) -> Optional[NewsPoller]:
+        if not ENABLE_NEWS_POLLER:
+            return None
+        return NewsPoller(self.news_searcher, self.db)
+
+    def _built(self, name: str):
+        """Уже созданная зависимость или None"""
+        return self.__dict__.get(name)
+
+    async def start(self):
+        """Запуск фоновых частей: загрузка кэша лент, HTTP пул, опрос лент, буфер постов"""
+        if self._started:
+            return
+        self._started = True
+
+        await self.feed_cache.load()
+        await self.http.start()
+        if self.news_poller:
+            self.news_poller.start()
+        self.post_buffer.start()
+
+    async def close(self):
+        """Остановка в обратном порядке: сначала источники работы, потом хранилища"""
+        if self._closed:
+            return
+        self._closed = True
+
+        started = time.monotonic()
+        if self._built('news_poller'):
+            await self.news_poller.stop()
+        if self._built('post_buffer'):
+            await self.post_buffer.stop()
+
+        if self._built('gemini'):
+            await self.gemini.close()
+        elif self._built('news_searcher'):
+            await self.news_searcher.close()
+        if self._built('http'):
+            await self.http.close()
+        if self._built('feed_parser'):
+            self.feed_parser.close()
+
+        # Дописываем кэши, останавливаем потоки базы данных и закрываем соединения
+        if self._built('feed_cache'):
+            await self.feed_cache.flush()
+        if self._built('generation_cache'):
+            await self.generation_cache.flush()
+        if self._built('db'):
+            await self.db.prune_generation_cache(time.time())
+            await self.db.close()
+        logger.info(f"Services closed in {time.monotonic() - started:.1f}s")
+
+_default_services = None
+
+def get_default_services() -> Services:
+    """Общий контейнер для объектов, созданных без явных зависимостей"""
+    global _default_services
+    if _default_services is None:
+        _default_services = Services()
+    return _default_services
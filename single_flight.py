@@ -0,0 +1,43 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Hashable, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+class SingleFlight:
+    """Склейка одинаковых одновременных запросов.
+
+    Пока работа с ключом выполняется, остальные вызовы с тем же ключом
+    не запускают ее заново, а ждут тот же результат (или ту же ошибку).
+    Отмена одного из ожидающих не прерывает работу для остальных.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.shared = 0
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> T:
+        """Результат func() для key; одновременные вызовы получают общий результат"""
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(func())
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._forget(key, future))
+        else:
+            self.shared += 1
+            logger.debug(f"Joined in-flight request {key!r}")
+
+        return await asyncio.shield(future)
+
+    def running(self, key: Hashable) -> Optional[asyncio.Future]:
+        """Выполняющаяся сейчас работа с ключом или None"""
+        return self._inflight.get(key)
+
+    def _forget(self, key: Hashable, future: asyncio.Future):
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+        # Ошибку уже получили ожидающие; если их не осталось, не пишем "never retrieved"
+        if not future.cancelled():
+            future.exception()
@@ -0,0 +1,86 @@
+import asyncio
+import logging
+import time
+from typing import Callable, Optional
+from telegram import InlineKeyboardMarkup, Message
+from telegram.error import BadRequest, RetryAfter, TelegramError
+from config import STREAM_EDIT_INTERVAL, STREAM_MIN_CHARS_DELTA
+
+logger = logging.getLogger(__name__)
+
+MAX_MESSAGE_LENGTH = 4096
+
+class StreamingMessageEditor:
+    """Постепенное обновление сообщения по мере генерации текста.
+
+    Частые правки одного сообщения Telegram ограничивает, поэтому правки
+    объединяются: не чаще раза в STREAM_EDIT_INTERVAL секунд и только если
+    текст заметно вырос. Промежуточные версии отправляются без разметки
+    (незакрытый Markdown дает ошибку), итоговая - с разметкой и кнопками.
+    """
+
+    def __init__(self, message: Message, render: Callable[[str], str] = None,
+                 interval: float = STREAM_EDIT_INTERVAL, min_delta: int = STREAM_MIN_CHARS_DELTA):
+        self.message = message
+        self.render = render or (lambda text: text)
+        self.interval = interval
+        self.min_delta = min_delta
+
+        self._latest = ''
+        self._sent_length = 0
+        self._next_edit_at = 0.0
+        self._edit_task = None
+        self.edits = 0
+
+    async def update(self, text: str):
+        """Новый накопленный текст; правка планируется, если пора"""
+        self._latest = text
+        if self._edit_task and not self._edit_task.done():
+            return
+        if len(text) - self._sent_length < self.min_delta or time.monotonic() < self._next_edit_at:
+            return
+        self._edit_task = asyncio.ensure_future(self._edit_progress(text))
+
+    async def _edit_progress(self, text: str):
+        """Промежуточная правка сообщения"""
+        rendered = self.render(text)
+        if len(rendered) > MAX_MESSAGE_LENGTH:
+            rendered = rendered[:MAX_MESSAGE_LENGTH - 1] + '…'
+
+        self._next_edit_at = time.monotonic() + self.interval
+        try:
+            await self.message.edit_text(rendered)
+            self._sent_length = len(text)
+            self.edits += 1
+        except RetryAfter as e:
+            # Лимит правок: откладываем следующую, итоговая правка все равно будет
+            self._next_edit_at = time.monotonic() + e.retry_after
+        except TelegramError as e:
+            logger.debug(f"Progressive edit skipped: {e}")
+
+    async def finish(self, text: str, reply_markup: InlineKeyboardMarkup = None,
+                     parse_mode: Optional[str] = 'Markdown'):
+        """Итоговая правка: полный текст с разметкой и кнопками"""
+        if self._edit_task and not self._edit_task.done():
+            self._edit_task.cancel()
+            try:
+                await self._edit_task
+            except asyncio.CancelledError:
+                pass
+
+        delay = self._next_edit_at - time.monotonic()
+        if delay > self.interval:
+            # Telegram попросил подождать дольше обычного интервала
+            await asyncio.sleep(delay)
+
+        try:
+            await self.message.edit_text(text, reply_markup=reply_markup, parse_mode=parse_mode)
+        except BadRequest as e:
+            if 'not modified' in str(e).lower():
+                return
+            if parse_mode is None:
+                raise
+            # Модель могла вернуть некорректный Markdown - показываем текст без разметки
+            logger.warning(f"Final edit with {parse_mode} failed, sending plain text: {e}")
+            await self.message.edit_text(text, reply_markup=reply_markup)
+        self.edits += 1
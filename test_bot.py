@@ -0,0 +1,88 @@
+import unittest
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+from telegram import CallbackQuery, Chat, Message, Update, User
+from bot import PostAIBot, WAITING_TOPIC
+from gemini_client import GeminiClient
+from generation_cache import GenerationCache
+
+CHANNEL_ID = -1001234567890
+
+class FakeModels:
+    """Потоковые ответы модели без обращения к API"""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def generate_content_stream(self, model, contents, config):
+        self.calls += 1
+        calls = self.calls
+
+        async def chunks():
+            yield SimpleNamespace(text=f"Пост {calls}")
+        return chunks()
+
+class TopicMoreButtonTest(unittest.IsolatedAsyncioTestCase):
+    """Кнопка "🔄 Сгенерировать еще" для поста по теме обходит кэш ответов"""
+
+    def setUp(self):
+        patchers = [
+            patch('bot.TELEGRAM_BOT_TOKEN', '123456:TEST'),
+            patch('gemini_client.GEMINI_API_KEY', 'test-key')
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.models = FakeModels()
+        gemini = GeminiClient(cache=GenerationCache())
+        gemini._aio_models = self.models
+        gemini._generation_config = lambda: None
+
+        services = MagicMock()
+        services.db.get_style_analysis = AsyncMock(return_value={'style_analysis': 'Короткие посты'})
+        services.gemini = gemini
+        self.bot = PostAIBot(services=services)
+        self.context = SimpleNamespace(user_data={})
+
+    def _callback_update(self, data: str) -> Update:
+        user = User(id=1, first_name='Test', is_bot=False)
+        message = Message(
+            message_id=1, date=datetime.now(timezone.utc),
+            chat=Chat(id=1, type=Chat.PRIVATE), from_user=user
+        )
+        query = CallbackQuery(id='1', from_user=user, chat_instance='1', data=data, message=message)
+        return Update(update_id=1, callback_query=query)
+
+    async def _press_and_generate(self, data: str):
+        query = SimpleNamespace(data=data, answer=AsyncMock(), edit_message_text=AsyncMock())
+        state = await self.bot.topic_generation_start(SimpleNamespace(callback_query=query), self.context)
+        self.assertEqual(state, WAITING_TOPIC)
+
+        status = SimpleNamespace(edit_text=AsyncMock())
+        update = SimpleNamespace(
+            message=SimpleNamespace(text='мотивация', reply_text=AsyncMock(return_value=status)),
+            effective_user=SimpleNamespace(id=1)
+        )
+        await self.bot.generate_by_topic(update, self.context)
+        return status.edit_text.await_args.args[0]
+
+    def test_more_callback_reaches_conversation_entry_point(self):
+        update = self._callback_update(f"generate_topic_{CHANNEL_ID}_more")
+        handler = next(h for h in self.bot.application.handlers[0] if h.check_update(update))
+        self.assertIs(handler.entry_points[0].callback.__func__, PostAIBot.topic_generation_start)
+
+    async def test_more_button_bypasses_cache(self):
+        first = await self._press_and_generate(f"generate_topic_{CHANNEL_ID}")
+        cached = await self._press_and_generate(f"generate_topic_{CHANNEL_ID}")
+        self.assertEqual(self.models.calls, 1)
+        self.assertEqual(cached, first)
+
+        fresh = await self._press_and_generate(f"generate_topic_{CHANNEL_ID}_more")
+        self.assertEqual(self.models.calls, 2)
+        self.assertIn("Пост 2", fresh)
+        self.assertNotIn('fresh_generation', self.context.user_data)
+
+if __name__ == '__main__':
+    unittest.main()
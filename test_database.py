@@ -0,0 +1,49 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime, timezone
+from database import Database
+
+class AddArticlesTest(unittest.TestCase):
+    """Счетчик add_articles при включенном полнотекстовом индексе"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db = Database(os.path.join(self.tmpdir.name, 'test.db'))
+
+    def tearDown(self):
+        self.db.close()
+        self.tmpdir.cleanup()
+
+    def _articles(self, count, suffix=''):
+        return [
+            {
+                'title': f'Новость {i}{suffix}',
+                'summary': f'Текст новости {i}',
+                'link': f'https://example.com/{i}',
+                'source': 'example',
+                'published': datetime(2024, 1, 1, tzinfo=timezone.utc)
+            }
+            for i in range(count)
+        ]
+
+    def test_fts_index_present(self):
+        conn = self.db.get_connection()
+        row = conn.execute("SELECT name FROM sqlite_master WHERE name = 'articles_fts'").fetchone()
+        self.assertIsNotNone(row)
+
+    def test_counts_inserted_rows_only(self):
+        self.assertEqual(self.db.add_articles('https://example.com/rss', self._articles(4)), 4)
+
+    def test_unchanged_articles_not_counted(self):
+        self.db.add_articles('https://example.com/rss', self._articles(3))
+        self.assertEqual(self.db.add_articles('https://example.com/rss', self._articles(3)), 0)
+
+    def test_changed_articles_counted(self):
+        self.db.add_articles('https://example.com/rss', self._articles(3))
+        changed = self._articles(3)
+        changed[1]['title'] += ' (обновлено)'
+        self.assertEqual(self.db.add_articles('https://example.com/rss', changed), 1)
+
+if __name__ == '__main__':
+    unittest.main()
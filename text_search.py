@@ -0,0 +1,51 @@
+import re
+from typing import List
+
+# Частые окончания, которые отбрасываем, чтобы "интеллект"/"интеллекта"/"интеллектом"
+# давали одну основу. Это не полноценный стеммер, но для поиска по подстроке
+# (trigram) и по префиксу (unicode61) его хватает. Длинные окончания - первыми.
+_ENDINGS = [
+    'ого', 'его', 'ому', 'ему', 'ыми', 'ими', 'ями', 'ами', 'ией',
+    'ая', 'яя', 'ое', 'ее', 'ые', 'ие', 'ый', 'ий', 'ой', 'ом', 'ем',
+    'ам', 'ям', 'ах', 'ях', 'ов', 'ев', 'ей', 'ью', 'ия', 'ии', 'ую', 'юю',
+    'а', 'я', 'о', 'е', 'ы', 'и', 'у', 'ю', 'ь', 'й',
+    'ies', 'es', 's'
+]
+# Окончания по длине: проверка - один поиск в множестве на каждую длину
+_ENDINGS_BY_LENGTH = [
+    (length, frozenset(e for e in _ENDINGS if len(e) == length))
+    for length in sorted({len(e) for e in _ENDINGS}, reverse=True)
+]
+_MIN_STEM_LENGTH = 4
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+def stem(word: str) -> str:
+    """Грубая основа слова без окончания"""
+    word = word.lower()
+    for length, endings in _ENDINGS_BY_LENGTH:
+        if len(word) - length >= _MIN_STEM_LENGTH and word[-length:] in endings:
+            return word[:-length]
+    return word
+
+def topic_terms(topic: str, min_length: int = 3) -> List[str]:
+    """Основы значимых слов темы"""
+    terms = []
+    for word in _WORD_RE.findall(topic.lower()):
+        if len(word) < min_length:
+            continue
+        term = stem(word)
+        if term not in terms:
+            terms.append(term)
+    return terms
+
+def matches_topic(text: str, terms: List[str]) -> bool:
+    """Все основы темы встречаются в тексте"""
+    text = text.lower()
+    return bool(terms) and all(term in text for term in terms)
+
+def build_fts_query(terms: List[str], trigram: bool) -> str:
+    """Запрос FTS5: подстроки для trigram, префиксы для unicode61"""
+    quoted = ['"' + term.replace('"', '""') + '"' for term in terms]
+    if not trigram:
+        quoted = [term + '*' for term in quoted]
+    return ' AND '.join(quoted)